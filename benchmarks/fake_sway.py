@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional, Set
+
+from ustatus.utils.swaymsg import (
+    EVENT_NAMES,
+    IPC_HEADER,
+    IPC_MAGIC,
+    MessageType,
+)
+
+EVENT_TYPES = {name: message_type for message_type, name in EVENT_NAMES.items()}
+
+
+class FakeSwayServer:
+    """Stand-in for sway's IPC socket, for benchmarks and manual testing.
+
+    Implements get_workspaces, get_outputs, get_tree, subscribe and command
+    (only `workspace [number] <name>` does anything) on a temporary socket,
+    and exports it as $SWAYSOCK while running. Events are sent to subscribers
+    with emit().
+    """
+
+    def __init__(self, outputs: List[str], workspaces_per_output: int):
+        self.outputs = outputs
+        self.workspaces: Dict[int, Dict] = dict()
+        self.next_id = 1
+        self.connections: Set[asyncio.StreamWriter] = set()
+        self.subscribers: Dict[asyncio.StreamWriter, Set[str]] = dict()
+        self.commands_received = 0
+        self.socket_dir = tempfile.TemporaryDirectory(prefix="fake-sway-")
+        self.socket_path = os.path.join(self.socket_dir.name, "ipc.sock")
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.old_swaysock: Optional[str] = None
+        for output in outputs:
+            for _ in range(workspaces_per_output):
+                self.new_workspace(output)
+        if self.workspaces:
+            next(iter(self.workspaces.values()))["focused"] = True
+
+    async def __aenter__(self):
+        self.server = await asyncio.start_unix_server(self._handle, self.socket_path)
+        self.old_swaysock = os.environ.get("SWAYSOCK")
+        os.environ["SWAYSOCK"] = self.socket_path
+        return self
+
+    async def __aexit__(self, *args):
+        if self.old_swaysock is None:
+            os.environ.pop("SWAYSOCK", None)
+        else:
+            os.environ["SWAYSOCK"] = self.old_swaysock
+        for writer in list(self.connections):
+            writer.close()
+        assert self.server is not None
+        self.server.close()
+        await self.server.wait_closed()
+        # Let the connection handlers see the closed sockets and return
+        await asyncio.sleep(0.01)
+        self.socket_dir.cleanup()
+
+    def new_workspace(self, output: str, num: Optional[int] = None) -> Dict:
+        id = self.next_id
+        self.next_id += 1
+        num = num if num is not None else id
+        workspace = {
+            "id": id,
+            "type": "workspace",
+            "num": num,
+            "name": str(num),
+            "output": output,
+            "focused": False,
+            "visible": False,
+            "urgent": False,
+            "nodes": [],
+            "floating_nodes": [],
+        }
+        self.workspaces[id] = workspace
+        return workspace
+
+    def emit(self, event_type: str, event: Dict):
+        payload = json.dumps(event).encode()
+        message = (
+            IPC_HEADER.pack(IPC_MAGIC, len(payload), EVENT_TYPES[event_type]) + payload
+        )
+        for writer, event_types in self.subscribers.items():
+            if event_type in event_types:
+                writer.write(message)
+
+    async def drain(self):
+        for writer in list(self.subscribers):
+            await writer.drain()
+
+    def get_outputs(self) -> List[Dict]:
+        return [
+            {
+                "name": output,
+                "make": "Fake",
+                "model": output,
+                "serial": str(num),
+                "active": True,
+                "rect": {"x": 1920 * num, "y": 0, "width": 1920, "height": 1080},
+            }
+            for num, output in enumerate(self.outputs)
+        ]
+
+    def get_tree(self) -> Dict:
+        return {
+            "id": 0,
+            "type": "root",
+            "nodes": [
+                {
+                    "id": -(num + 1),
+                    "type": "output",
+                    "name": output,
+                    "nodes": [
+                        ws for ws in self.workspaces.values() if ws["output"] == output
+                    ],
+                }
+                for num, output in enumerate(self.outputs)
+            ],
+        }
+
+    def focus(self, workspace: Dict):
+        old = next((ws for ws in self.workspaces.values() if ws["focused"]), None)
+        if old is not None:
+            old["focused"] = False
+        workspace["focused"] = True
+        self.emit("workspace", {"change": "focus", "current": workspace, "old": old})
+
+    def _command(self, command: str) -> List[Dict]:
+        self.commands_received += 1
+        match = re.fullmatch(r"workspace (?:number )?(\S+)", command.strip())
+        if match is None:
+            return [{"success": True}]
+        name = match.group(1)
+        workspace = next(
+            (ws for ws in self.workspaces.values() if ws["name"] == name), None
+        )
+        if workspace is None:
+            workspace = self.new_workspace(
+                self.outputs[0], int(name) if name.isdigit() else -1
+            )
+            workspace["name"] = name
+            self.emit("workspace", {"change": "init", "current": workspace})
+        self.focus(workspace)
+        return [{"success": True}]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections.add(writer)
+        try:
+            while True:
+                magic, length, message_type = IPC_HEADER.unpack(
+                    await reader.readexactly(IPC_HEADER.size)
+                )
+                payload = (await reader.readexactly(length)).decode()
+                match message_type:
+                    case MessageType.RUN_COMMAND:
+                        reply = self._command(payload)
+                    case MessageType.GET_WORKSPACES:
+                        reply = list(self.workspaces.values())
+                    case MessageType.GET_OUTPUTS:
+                        reply = self.get_outputs()
+                    case MessageType.GET_TREE:
+                        reply = self.get_tree()
+                    case MessageType.SUBSCRIBE:
+                        self.subscribers.setdefault(writer, set()).update(
+                            json.loads(payload)
+                        )
+                        reply = {"success": True}
+                    case _:
+                        reply = {"success": False, "error": "Unsupported message"}
+                data = json.dumps(reply).encode()
+                writer.write(IPC_HEADER.pack(IPC_MAGIC, len(data), message_type) + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            self.subscribers.pop(writer, None)
+            writer.close()
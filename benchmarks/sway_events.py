@@ -0,0 +1,291 @@
+"""Replay workspace event storms against a fake sway IPC server.
+
+Usage: python benchmarks/sway_events.py [--target hub|framer|module] [--rate N]
+
+The hub target measures the IPC socket and SwayEventHub, framer measures the
+JsonStreamFramer used for `swaymsg --monitor`, and module drives a real
+SwayModule in a GTK window (requires a display). Reports throughput, per-event
+latency and how long the event loop was stalled.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from fake_sway import FakeSwayServer
+
+from ustatus.utils.swaymsg import STREAM_CHUNK_SIZE, JsonStreamFramer, get_event_hub
+
+STALL_PROBE_SECONDS = 0.001
+
+
+class Storm:
+    """Generates a valid sequence of workspace events on the fake server."""
+
+    def __init__(self, server: FakeSwayServer, seed: int):
+        self.server = server
+        self.random = random.Random(seed)
+        self.base_count = len(server.workspaces)
+        self.seq = 0
+        self.sent: Dict[int, float] = dict()
+
+    def next_event(self) -> Dict:
+        workspaces = list(self.server.workspaces.values())
+        choice = self.random.random()
+        if choice < 0.4:
+            workspace = self.random.choice(workspaces)
+            old = next((ws for ws in workspaces if ws["focused"]), None)
+            if old is not None:
+                old["focused"] = False
+            workspace["focused"] = True
+            event = {"change": "focus", "current": workspace, "old": old}
+        elif choice < 0.6 and len(workspaces) > self.base_count:
+            candidates = [ws for ws in workspaces if not ws["focused"]]
+            workspace = self.random.choice(candidates)
+            del self.server.workspaces[workspace["id"]]
+            event = {"change": "empty", "current": workspace}
+        elif choice < 0.8:
+            workspace = self.server.new_workspace(
+                self.random.choice(self.server.outputs)
+            )
+            event = {"change": "init", "current": workspace}
+        elif choice < 0.9:
+            workspace = self.random.choice(workspaces)
+            workspace["name"] = f"{workspace['num']}:{self.random.randrange(100)}"
+            event = {"change": "rename", "current": workspace}
+        else:
+            workspace = self.random.choice(workspaces)
+            workspace["output"] = self.random.choice(self.server.outputs)
+            event = {"change": "move", "current": workspace}
+        self.seq += 1
+        event["bench_seq"] = self.seq
+        return event
+
+    def emit(self):
+        event = self.next_event()
+        self.sent[event["bench_seq"]] = time.perf_counter()
+        self.server.emit("workspace", event)
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.stalls: List[float] = []
+        self.flushes = 0
+
+    def report(self, target: str, events: int, elapsed: float):
+        print(f"target:          {target}")
+        print(f"events:          {events}")
+        print(f"events/sec:      {events / elapsed:.0f}")
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            print(
+                "latency ms:      "
+                f"p50={_percentile(latencies, 50) * 1e3:.3f} "
+                f"p95={_percentile(latencies, 95) * 1e3:.3f} "
+                f"p99={_percentile(latencies, 99) * 1e3:.3f} "
+                f"max={latencies[-1] * 1e3:.3f}"
+            )
+        if self.stalls:
+            print(
+                "loop stall ms:   "
+                f"max={max(self.stalls) * 1e3:.3f} "
+                f"total={sum(self.stalls) * 1e3:.3f} "
+                f"mean={statistics.mean(self.stalls) * 1e3:.3f}"
+            )
+        if self.flushes:
+            print(f"UI flushes:      {self.flushes}")
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def probe_stalls(stats: Stats, stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(STALL_PROBE_SECONDS)
+        stats.stalls.append(max(0.0, loop.time() - start - STALL_PROBE_SECONDS))
+
+
+async def replay(storm: Storm, count: int, rate: float):
+    """Emit count events, rate per second (0 for as fast as possible)."""
+    start = time.perf_counter()
+    emitted = 0
+    while emitted < count:
+        if rate:
+            due = min(count, int((time.perf_counter() - start) * rate) + 1)
+        else:
+            due = min(count, emitted + 100)
+        while emitted < due:
+            storm.emit()
+            emitted += 1
+        await storm.server.drain()
+        await asyncio.sleep(1 / rate if rate else 0)
+
+
+async def wait_for(predicate: Callable[[], bool], timeout: float = 30):
+    deadline = time.perf_counter() + timeout
+    while not predicate():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Timed out waiting for events to be delivered")
+        await asyncio.sleep(0.001)
+
+
+async def bench_hub(args, stats: Stats):
+    async with FakeSwayServer(args.outputs, args.workspaces) as server:
+        storm = Storm(server, args.seed)
+        received = 0
+
+        def on_event(event):
+            nonlocal received
+            received += 1
+            stats.latencies.append(time.perf_counter() - storm.sent[event["bench_seq"]])
+
+        await get_event_hub().subscribe("workspace", on_event)
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_stalls(stats, stop))
+        start = time.perf_counter()
+        await replay(storm, args.events, args.rate)
+        await wait_for(lambda: received >= args.events)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+        stats.report("hub", received, elapsed)
+
+
+async def bench_framer(args, stats: Stats):
+    server = FakeSwayServer(args.outputs, args.workspaces)
+    storm = Storm(server, args.seed)
+    # swaymsg --monitor pretty-prints every event
+    stream = "".join(
+        json.dumps(storm.next_event(), indent=2) + "\n" for _ in range(args.events)
+    ).encode()
+    framer = JsonStreamFramer()
+    received = 0
+    start = time.perf_counter()
+    for offset in range(0, len(stream), STREAM_CHUNK_SIZE):
+        chunk_start = time.perf_counter()
+        documents = framer.feed(stream[offset : offset + STREAM_CHUNK_SIZE])
+        chunk_time = time.perf_counter() - chunk_start
+        received += len(documents)
+        stats.stalls.append(chunk_time)
+    elapsed = time.perf_counter() - start
+    print(f"stream bytes:    {len(stream)}")
+    stats.report("framer", received, elapsed)
+
+
+async def bench_module(args, stats: Stats):
+    import gi
+
+    gi.require_version("Gtk", "3.0")
+    from gi.repository import Gtk
+    from ustatus.config import BarConfig, ModuleConfig
+    from ustatus.modules.sway_module import SwayModule
+
+    config_dict = {
+        "bars": {"bench": {}},
+        "modules": {
+            "sway": {
+                "type": "sway",
+                "show_label": False,
+                "label": "",
+                "length": 25,
+                "show_window_count": False,
+            }
+        },
+    }
+    async with FakeSwayServer(args.outputs, args.workspaces) as server:
+        storm = Storm(server, args.seed)
+        received = 0
+        applied = 0
+        in_flight: List[int] = []
+        module = SwayModule(
+            output=args.outputs[0] if args.per_output else None,
+            gtk_orientation=Gtk.Orientation.HORIZONTAL,
+            toggle_modal=lambda widget: None,
+            module_config=ModuleConfig("sway", config_dict["modules"]["sway"]),
+            bar_config=BarConfig("bench", config_dict["bars"]["bench"]),
+            bar_width=0,
+        )
+        on_workspace_event = module._on_workspace_event
+        on_move_event = module._on_move_event
+        flush = module._flush
+
+        def record(handler):
+            def wrapper(event):
+                nonlocal received
+                received += 1
+                in_flight.append(event["bench_seq"])
+                handler(event)
+
+            return wrapper
+
+        def recording_flush(widget, frame_clock):
+            nonlocal applied
+            now = time.perf_counter()
+            stats.flushes += 1
+            stats.latencies.extend(now - storm.sent[seq] for seq in in_flight)
+            applied += len(in_flight)
+            in_flight.clear()
+            return flush(widget, frame_clock)
+
+        module._on_workspace_event = record(on_workspace_event)
+        module._on_move_event = record(on_move_event)
+        module._flush = recording_flush
+        window = Gtk.Window()
+        window.add(module)
+        window.show_all()
+        await wait_for(lambda: hasattr(module, "subscriptions"))
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe_stalls(stats, stop))
+        start = time.perf_counter()
+        await replay(storm, args.events, args.rate)
+        # Events for other outputs are filtered out by the hub
+        await asyncio.sleep(0.1)
+        await wait_for(lambda: applied >= received)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await prober
+        window.destroy()
+        stats.report("module", received, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["hub", "framer", "module"], default="hub")
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="events per second, 0 for unlimited"
+    )
+    parser.add_argument("--outputs", type=lambda s: s.split(","), default=["DP-1"])
+    parser.add_argument("--workspaces", type=int, default=10, help="per output")
+    parser.add_argument(
+        "--per-output",
+        action="store_true",
+        help="bind the module to the first output (module target only)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stats = Stats()
+    match args.target:
+        case "hub":
+            asyncio.run(bench_hub(args, stats))
+        case "framer":
+            asyncio.run(bench_framer(args, stats))
+        case "module":
+            import gbulb
+
+            gbulb.install(gtk=True)
+            asyncio.get_event_loop().run_until_complete(bench_module(args, stats))
+
+
+if __name__ == "__main__":
+    main()
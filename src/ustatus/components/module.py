@@ -1,4 +1,4 @@
-from typing import Callable, Optional
+from typing import Callable, List, Optional
 from gi.repository import Gtk, GLib
 from python_reactive_ui import Component
 from python_reactive_ui.backends.gtk3.builtin.box import Box
@@ -7,6 +7,28 @@ from python_reactive_ui.backends.gtk3.builtin.label import Label
 from ustatus.config import ModuleConfig
 
 
+class ModuleLifetime:
+    """Passed to reactive modules as the "lifetime" prop, and closed when the
+    module's widget is destroyed, so that timers and shared data source
+    listeners do not outlive it."""
+
+    def __init__(self):
+        self.closed = False
+        self.cleanups: List[Callable[[], None]] = []
+
+    def add_cleanup(self, cleanup: Callable[[], None]):
+        if self.closed:
+            cleanup()
+        else:
+            self.cleanups.append(cleanup)
+
+    def close(self):
+        self.closed = True
+        cleanups, self.cleanups = self.cleanups, []
+        for cleanup in cleanups:
+            cleanup()
+
+
 class ReactiveModule(Component):
     def _render(self, props, children):
         module_config = props["module_config"]
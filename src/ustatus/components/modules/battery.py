@@ -5,22 +5,36 @@ from python_reactive_ui.backends.gtk3.builtin.box import Box
 from python_reactive_ui.backends.gtk3.builtin.label import Label
 from ustatus.components.drawing.battery_icon import BatteryIcon
 from ustatus.hooks.use_timer import use_timer
+import math
 import psutil
+import time
+
+BATTERY_CACHE_SECONDS = 1
 
 
 class Battery(Component):
     BatteryData = namedtuple("BatteryData", ["charge", "ac"])
 
+    # Shared by all battery modules in the process, so bars polling at the
+    # same time read the battery once
+    _cached_data = None
+    _cached_time = -math.inf
+
     @classmethod
     def _get_data(cls):
+        now = time.monotonic()
+        if now - cls._cached_time < BATTERY_CACHE_SECONDS:
+            return cls._cached_data
         battery_data = psutil.sensors_battery()
-        return (
+        cls._cached_data = (
             cls.BatteryData(
                 charge=battery_data.percent / 100, ac=battery_data.power_plugged
             )
             if battery_data
             else cls.BatteryData(charge=0, ac=True)
         )
+        cls._cached_time = now
+        return cls._cached_data
 
     def _render(self, props, children):
         data, set_data = use_state(self, Battery._get_data())
@@ -29,6 +43,7 @@ class Battery(Component):
             timer_secs=5,
             repeat=True,
             callback=lambda: set_data(Battery._get_data()),
+            lifetime=props.get("lifetime"),
         )
         return Box(
             { "halign": "center", "hexpand": True },
@@ -11,5 +11,10 @@ class Clock(Component):
 
     def _render(self, props, children):
         time, set_time = use_state(self, localtime())
-        handle = use_timer(self, 1, lambda: self._update_time(set_time))
+        handle = use_timer(
+            self,
+            1,
+            lambda: self._update_time(set_time),
+            lifetime=props.get("lifetime"),
+        )
         return Label({"text": strftime("%H:%M:%S", time), "hexpand": True})
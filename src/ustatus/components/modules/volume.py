@@ -1,5 +1,13 @@
-from typing import Callable
-from dbus_next.aio.message_bus import MessageBus
+import logging
+from typing import Callable, List, Optional
+from dbus_next.errors import DBusError
+from ustatus.utils.bus import get_session_bus
+from ustatus.utils.introspection import get_proxy_object
+from ustatus.utils.system_api import (
+    SYSTEM_API_NAME,
+    SYSTEM_API_PATH,
+    ensure_system_api,
+)
 from gi.repository import Gtk, GLib
 from pulsectl import pulsectl
 import pulsectl_asyncio, asyncio
@@ -16,31 +24,93 @@ from ustatus.graphics.volume import Volume
 from ustatus.module import Module
 
 
-class Volume(Component):
-    async def _setup_client(self, set_client, set_sinks):
-        name = "pysysapi.api"
-        path = "/pysysapi"
-        bus = await MessageBus().connect()
-        introspection = await bus.introspect(name, path)
-        proxy_object = bus.get_proxy_object(name, path, introspection)
-        interface = proxy_object.get_interface(VolumeInterface.INAME)
-        interface.on_event(
-            lambda event: asyncio.create_task(self._update_sinks(interface, set_sinks))
-        )
-        await self._update_sinks(interface, set_sinks)
-        set_client(interface)
+class VolumeSinks:
+    """Sinks reported by the system API's volume interface, shared by every
+    volume module in the process.
+
+    There is one proxy and one event handler, and a burst of events is
+    coalesced into at most one GetSinks in flight plus one trailing call.
+    """
+
+    def __init__(self):
+        self.sinks = None
+        self.listeners: List[Callable] = []
+        self.interface = None
+        self.start_task: Optional[asyncio.Task] = None
+        self.fetch_task: Optional[asyncio.Task] = None
+        self.fetch_again = False
+
+    def add_listener(self, listener: Callable):
+        self.listeners.append(listener)
+        if self.start_task is None:
+            self.start_task = asyncio.create_task(self._start())
+
+    def remove_listener(self, listener: Callable):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    async def _start(self):
+        try:
+            await ensure_system_api()
+            bus = await get_session_bus()
+            proxy_object = await get_proxy_object(
+                bus, SYSTEM_API_NAME, SYSTEM_API_PATH, [VolumeInterface.INAME]
+            )
+        except Exception as e:
+            logging.error(f"Failed to connect to the volume interface: {e}")
+            # Retried by the next listener
+            self.start_task = None
+            return
+        self.interface = proxy_object.get_interface(VolumeInterface.INAME)
+        self.interface.on_event(lambda event: self._request_update())
+        self._request_update()
+
+    def _request_update(self):
+        if self.fetch_task is not None:
+            self.fetch_again = True
+            return
+        self.fetch_task = asyncio.create_task(self._fetch())
 
-    async def _update_sinks(self, client, set_sinks):
-        set_sinks(await client.call_get_sinks())
+    async def _fetch(self):
+        try:
+            while True:
+                self.fetch_again = False
+                try:
+                    self.sinks = await self.interface.call_get_sinks()
+                except DBusError as e:
+                    logging.warning(f"Failed to get sinks: {e}")
+                    return
+                for listener in list(self.listeners):
+                    listener(self.sinks)
+                if not self.fetch_again:
+                    return
+        finally:
+            self.fetch_task = None
+
+
+_volume_sinks: Optional[VolumeSinks] = None
+
+
+def get_volume_sinks() -> VolumeSinks:
+    global _volume_sinks
+    if _volume_sinks is None:
+        _volume_sinks = VolumeSinks()
+    return _volume_sinks
+
+
+class Volume(Component):
+    def _subscribe(self, props, source: VolumeSinks, set_sinks: Callable):
+        source.add_listener(set_sinks)
+        lifetime = props.get("lifetime")
+        if lifetime is not None:
+            lifetime.add_cleanup(lambda: source.remove_listener(set_sinks))
 
     def _render(self, props, children):
-        sinks, set_sinks = use_state(self, dict())
-        client, set_client = use_state(self, None)
-        use_effect(
-            self,
-            lambda: asyncio.create_task(self._setup_client(set_client, set_sinks)),
-            [],
+        source = get_volume_sinks()
+        sinks, set_sinks = use_state(
+            self, source.sinks if source.sinks is not None else dict()
         )
+        use_effect(self, lambda: self._subscribe(props, source, set_sinks), [])
 
         return Box(
             {"hexpand": True, "halign": "fill", "size_request": (-1, 60)},
@@ -1,33 +1,115 @@
 import argparse
+import hashlib
+import json
 import logging
-from typing import Dict
-from jsonschema import validate
-import tomli
+import pickle
+from typing import Dict, List, Optional, Tuple
 import os.path
 import os
 import copy
+from ustatus.utils.cache_dir import prune_cache_dir
+from ustatus.utils.profiler import parse_budget
 from ustatus.schema import cmdline_friendly, schema, bar, get_python_type, module
 
+# Bump when the compiled records change in a way the schema does not show
+CONFIG_CACHE_VERSION = 1
+CONFIG_CACHE_ENTRIES = 8
+
 
 class Config:
+    """Configuration from the config files and command line, compiled into
+    BarConfig and ModuleConfig records.
+
+    Compiled records are cached on disk, keyed by the contents of the config
+    files, the schema and the command line overrides, so an unchanged config
+    is neither parsed nor validated again.
+    """
+
     def __init__(self):
-        self.config_dict = dict({"bars": dict(), "modules": dict()})
-        self._update_with_config_files()
         self._update_with_arguments()
-        self._update_with_defaults()
-        validate(instance=self.config_dict, schema=schema)
+        # Bars added at runtime, as (bar name, output) by instance name
+        self.instances: Dict[str, Tuple[str, Optional[str]]] = dict()
+        try:
+            self.bars, self.modules = self._load()
+        except ConfigError as e:
+            logging.error(f"{e}. Exiting...")
+            exit(1)
+
+    def reload(self) -> bool:
+        """Compile the config files again, keeping the command line overrides
+        and bar instances, and return whether the result changed.
+
+        Raises ConfigError and keeps the current config if the files are
+        invalid.
+        """
+        bars, modules = self._load()
+        for instance_name, (bar_name, output) in self.instances.items():
+            if bar_name in bars:
+                bars[instance_name] = self._make_instance(
+                    bars[bar_name], instance_name, output
+                )
+            elif instance_name in self.bars:
+                bars[instance_name] = self.bars[instance_name]
+        changed = bars != self.bars or modules != self.modules
+        self.bars, self.modules = bars, modules
+        return changed
+
+    def _load(self) -> Tuple[Dict[str, "BarConfig"], Dict[str, "ModuleConfig"]]:
+        sources = [(path, read_config_file(path)) for path in get_config_paths()]
+        key = get_cache_key(sources, self.bar_names, self.bar_overrides)
+        compiled = load_compiled_config(key)
+        if compiled is None:
+            compiled = self._compile(sources)
+            store_compiled_config(key, compiled)
+        else:
+            logging.info("Loaded compiled config from cache")
+        return compiled
+
+    def _compile(
+        self, sources: List[Tuple[str, Optional[bytes]]]
+    ) -> Tuple[Dict[str, "BarConfig"], Dict[str, "ModuleConfig"]]:
+        from jsonschema import ValidationError, validate
+
+        self.config_dict = dict({"bars": dict(), "modules": dict()})
+        try:
+            # Tables of the wrong type, such as `bars = 3`, fail here before
+            # they get to validation
+            self._update_with_config_files(sources)
+            self._update_with_overrides()
+            self._update_with_defaults()
+        except (TypeError, AttributeError, KeyError) as e:
+            raise ConfigError(f"Invalid config structure: {e}")
+        try:
+            validate(instance=self.config_dict, schema=schema)
+        except ValidationError as e:
+            raise ConfigError(f"Invalid config: {e.message}")
+        try:
+            bars = {
+                name: BarConfig(name, values)
+                for name, values in self.config_dict["bars"].items()
+            }
+            modules = {
+                name: ModuleConfig(name, values)
+                for name, values in self.config_dict["modules"].items()
+            }
+        except (TypeError, AttributeError, KeyError) as e:
+            raise ConfigError(f"Invalid config structure: {e}")
+        return bars, modules
 
     def _inherit_close(self, curr_dict, toml_dict):
-        while "inherit" in curr_dict:
-            inherited = copy.deepcopy(toml_dict[curr_dict["inherit"]])
-            curr_dict.pop("inherit")
-            curr_dict = merge_configs(source=curr_dict, destination=inherited)
+        try:
+            while "inherit" in curr_dict:
+                inherited = copy.deepcopy(toml_dict[curr_dict["inherit"]])
+                curr_dict.pop("inherit")
+                curr_dict = merge_configs(source=curr_dict, destination=inherited)
+        except (TypeError, AttributeError, KeyError) as e:
+            raise ConfigError(f"Invalid inherit: {e}")
         return curr_dict
 
-    def _update_with_config_files(self):
-        paths = ["examples/ustatus.toml", get_user_config_path()]
-        while paths:
-            new_config = read_config_from_path(paths.pop())
+    def _update_with_config_files(self, sources: List[Tuple[str, Optional[bytes]]]):
+        sources = list(sources)
+        while sources:
+            new_config = parse_config(*sources.pop())
             if new_config:
                 self.config_dict = merge_configs(new_config, self.config_dict)
 
@@ -36,10 +118,30 @@ class Config:
             description="Start a ustatus instance of the bar of given name."
         )
         parser.add_argument(
-            "bar_name",
+            "bar_names",
             metavar="<bar>",
             type=str,
-            help="name of the bar to spawn",
+            nargs="*",
+            help="name of the bar to spawn (several are allowed with --daemon)",
+        )
+        parser.add_argument(
+            "--daemon",
+            action="store_true",
+            help="host all given bars in one process, and accept requests to create and destroy bars over D-Bus",
+        )
+        parser.add_argument(
+            "--profile-startup",
+            choices=["table", "json"],
+            default=None,
+            help="print how long each startup phase took, up to the first draw of every module",
+        )
+        parser.add_argument(
+            "--startup-budget",
+            metavar="<phase>=<ms>",
+            type=parse_budget,
+            action="append",
+            default=[],
+            help="exit with an error if a startup phase takes longer than this (repeatable, 'total' for the whole startup)",
         )
         for prop_name, prop_details in bar["properties"].items():
             if cmdline_friendly(prop_details):
@@ -51,14 +153,25 @@ class Config:
                     help=f"({prop_details['type']}) {prop_details.get('description', '')}",
                 )
         args = parser.parse_args()
-        self.bar_name = args.bar_name
-        if self.bar_name not in self.config_dict["bars"]:
-            self.config_dict["bars"][self.bar_name] = dict()
+        self.daemon = args.daemon
+        self.profile_startup = args.profile_startup
+        self.startup_budgets = dict(args.startup_budget)
+        self.bar_names = args.bar_names
+        if not self.daemon and len(self.bar_names) != 1:
+            parser.error("exactly one bar name is required without --daemon")
+        self.bar_name = self.bar_names[0] if self.bar_names else None
+        self.bar_overrides = dict()
         for prop_name, prop_details in bar["properties"].items():
             if cmdline_friendly(prop_details):
                 arg = args.__getattribute__(prop_name)
                 if arg is not None:
-                    self.config_dict["bars"][self.bar_name][prop_name] = arg
+                    self.bar_overrides[prop_name] = arg
+
+    def _update_with_overrides(self):
+        for bar_name in self.bar_names:
+            if bar_name not in self.config_dict["bars"]:
+                self.config_dict["bars"][bar_name] = dict()
+            self.config_dict["bars"][bar_name].update(self.bar_overrides)
 
     def _update_with_defaults(self):
         for bar_config in self.config_dict["bars"].values():
@@ -71,29 +184,94 @@ class Config:
                 if prop_name not in module_config:
                     module_config[prop_name] = prop_details.get("default", None)
 
-    def get_bar_config(self, bar_name):
-        return BarConfig(bar_name, self.config_dict)
+    def get_bar_config(self, bar_name) -> "BarConfig":
+        if bar_name not in self.bars:
+            raise ConfigError(f"Bar {bar_name} not defined.")
+        return self.bars[bar_name]
+
+    def add_bar_instance(self, bar_name, instance_name, output=None) -> "BarConfig":
+        """Add a copy of a bar's configuration under a new name, optionally
+        bound to an output."""
+        bar_config = self.get_bar_config(bar_name)
+        self.instances[instance_name] = (bar_name, output)
+        self.bars[instance_name] = self._make_instance(
+            bar_config, instance_name, output
+        )
+        return self.bars[instance_name]
+
+    def _make_instance(self, bar_config, instance_name, output) -> "BarConfig":
+        changes = dict(bar_name=instance_name)
+        if output:
+            changes["output"] = output
+        return bar_config.replace(**changes)
+
+    def remove_bar_instance(self, instance_name):
+        self.instances.pop(instance_name, None)
+        self.bars.pop(instance_name, None)
+
+    def get_module_config(self, module_name) -> "ModuleConfig":
+        if module_name not in self.modules:
+            raise ConfigError(f"Module {module_name} not defined.")
+        return self.modules[module_name]
+
+
+class ConfigRecord:
+    """Validated configuration of a bar or module, with one slot per schema
+    property. Records are immutable, and lists are stored as tuples."""
+
+    __slots__ = ()
+    name_slot = ""
+    properties: Tuple[str, ...] = ()
 
-    def get_module_config(self, module_name):
-        return ModuleConfig(module_name, self.config_dict)
+    def __init__(self, name: str, values: Dict):
+        object.__setattr__(self, self.name_slot, name)
+        for prop_name in self.properties:
+            object.__setattr__(self, prop_name, _freeze(values.get(prop_name)))
 
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-class ModuleConfig:
-    def __init__(self, module_name: str, config_dict: Dict):
-        self.module_name = module_name
-        self.config_dict = config_dict
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-    def __getattr__(self, name):
-        return self.config_dict["modules"][self.module_name][name]
+    def __eq__(self, other):
+        return type(self) is type(other) and self._key() == other._key()
 
+    def __hash__(self):
+        return hash(self._key())
 
-class BarConfig:
-    def __init__(self, bar_name: str, config_dict: Dict):
-        self.bar_name = bar_name
-        self.config_dict = config_dict
+    def __reduce__(self):
+        return (type(self), (self.get_name(), self.as_dict()))
 
-    def __getattr__(self, name):
-        return self.config_dict["bars"][self.bar_name][name]
+    def __repr__(self):
+        return f"{type(self).__name__}({self.get_name()!r}, {self.as_dict()!r})"
+
+    def get_name(self) -> str:
+        return getattr(self, self.name_slot)
+
+    def as_dict(self) -> Dict:
+        return {prop_name: getattr(self, prop_name) for prop_name in self.properties}
+
+    def replace(self, **changes):
+        name = changes.pop(self.name_slot, self.get_name())
+        return type(self)(name, {**self.as_dict(), **changes})
+
+    def _key(self):
+        return (self.get_name(),) + tuple(
+            getattr(self, prop_name) for prop_name in self.properties
+        )
+
+
+class ModuleConfig(ConfigRecord):
+    __slots__ = ("module_name", *module["properties"])
+    name_slot = "module_name"
+    properties = tuple(module["properties"])
+
+
+class BarConfig(ConfigRecord):
+    __slots__ = ("bar_name", *bar["properties"])
+    name_slot = "bar_name"
+    properties = tuple(bar["properties"])
 
 
 class ConfigError(Exception):
@@ -115,23 +293,82 @@ def merge_configs(source, destination):
     return destination
 
 
-def read_config_from_path(path: str):
+def _freeze(value):
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def read_config_file(path: str) -> Optional[bytes]:
     if os.path.exists(path):
         try:
-            file = open(path, "rb")
-        except:
+            with open(path, "rb") as file:
+                return file.read()
+        except OSError:
             logging.error(f"Failed to open file {path}")
-            return None
-        try:
-            toml_dict = tomli.load(file)
-        except:
-            logging.error(f"Failed to parse TOML file {path}. Exiting...")
-            exit(1)
-        file.close()
-        logging.info(f"Loaded config file {path}")
-        return toml_dict
-    else:
+    return None
+
+
+def parse_config(path: str, data: Optional[bytes]):
+    if data is None:
         return None
+    import tomli
+
+    try:
+        toml_dict = tomli.loads(data.decode())
+    except (tomli.TOMLDecodeError, UnicodeDecodeError) as e:
+        raise ConfigError(f"Failed to parse TOML file {path}: {e}")
+    logging.info(f"Loaded config file {path}")
+    return toml_dict
+
+
+def get_config_paths() -> List[str]:
+    return ["examples/ustatus.toml", get_user_config_path()]
+
+
+def get_cache_key(
+    sources: List[Tuple[str, Optional[bytes]]],
+    bar_names: List[str],
+    bar_overrides: Dict,
+) -> str:
+    digest = hashlib.sha256()
+    digest.update(f"{CONFIG_CACHE_VERSION}\0".encode())
+    digest.update(json.dumps(schema, sort_keys=True, default=repr).encode())
+    for path, data in sources:
+        digest.update(f"\0{path}\0".encode())
+        digest.update(b"missing" if data is None else hashlib.sha256(data).digest())
+    digest.update(json.dumps([bar_names, bar_overrides], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _get_config_cache_dir() -> str:
+    return os.path.join(get_user_cache_dir(), "config")
+
+
+def load_compiled_config(key: str):
+    path = os.path.join(_get_config_cache_dir(), f"{key}.pickle")
+    try:
+        with open(path, "rb") as file:
+            return pickle.load(file)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable config cache {path}: {e}")
+        return None
+
+
+def store_compiled_config(key: str, compiled):
+    cache_dir = _get_config_cache_dir()
+    path = os.path.join(cache_dir, f"{key}.pickle")
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(temp_path, "wb") as file:
+            pickle.dump(compiled, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+        prune_cache_dir(cache_dir, ".pickle", CONFIG_CACHE_ENTRIES)
+    except OSError as e:
+        logging.warning(f"Failed to cache compiled config: {e}")
 
 
 def get_user_config_path():
@@ -139,3 +376,10 @@ def get_user_config_path():
         return os.path.expandvars("$XDG_CONFIG_HOME/ustatus/ustatus.toml")
     else:
         return os.path.expandvars("$HOME/.config/ustatus/ustatus.toml")
+
+
+def get_user_cache_dir():
+    if "XDG_CACHE_HOME" in os.environ:
+        return os.path.expandvars("$XDG_CACHE_HOME/ustatus")
+    else:
+        return os.path.expandvars("$HOME/.cache/ustatus")
@@ -1,13 +1,21 @@
 import asyncio
-from typing import Callable
+from typing import Callable, Optional
 
 from python_reactive_ui import Component
 from python_reactive_ui.lib.hooks import use_effect
 
+from ustatus.components.module import ModuleLifetime
+
 
 def use_timer(
-    component: Component, timer_secs: float, callback: Callable, repeat: bool = True
+    component: Component,
+    timer_secs: float,
+    callback: Callable,
+    repeat: bool = True,
+    lifetime: Optional[ModuleLifetime] = None,
 ):
+    """Call callback every timer_secs, until lifetime is closed."""
+
     def set_timer():
         # get loop as a kwarg or take the default one
         loop = asyncio.get_event_loop()
@@ -15,6 +23,8 @@ def use_timer(
         start = loop.time()
 
         def run(handle):
+            if lifetime is not None and lifetime.closed:
+                return
             # XXX: we could record before = loop.time() and warn when callback(*args) took longer than interval
             # call callback now (possibly blocks run)
             callback()
@@ -40,6 +50,8 @@ def use_timer(
         )  # can't pass result of loop.call_at here, it needs periodic as an arg to run
         # set the delegate to be the Handle for call_at, causes periodic.cancel() to cancel the call to run
         periodic.delegate = loop.call_at(start + timer_secs, run, periodic)
+        if lifetime is not None:
+            lifetime.add_cleanup(periodic.cancel)
         # return the 'wrapperk'
         return periodic
 
@@ -1,6 +1,5 @@
-import asyncio, gbulb, logging, logging.handlers
-from multiprocessing import Process
-from python_dbus_system_api import start_server
+from ustatus.utils.profiler import get_startup_profiler
+import asyncio, gbulb, logging, logging.handlers, sys
 
 from ustatus.ustatus import Ustatus
 
@@ -8,11 +7,11 @@ from ustatus.utils.notifications import notify_error
 
 
 def main():
+    profiler = get_startup_profiler()
+    profiler.record("imports", profiler.origin)
     setup_logging()
-    # Ensure API is running (if already running this will just queue to get the
-    # bus name)
-    api_process = Process(target=start_server)
-    api_process.start()
+    # The python_dbus_system_api server is started on demand by the modules
+    # that use it, see ustatus.utils.system_api
     gbulb.install(gtk=True)  # only necessary if you're using GtkApplication
     application = Ustatus()
     loop = asyncio.get_event_loop()
@@ -20,6 +19,8 @@ def main():
         loop.run_forever(application=application)
     except Exception as e:
         notify_error(summary="Uncaught error", body=f"e")
+    if profiler.failed:
+        sys.exit(1)
 
 
 def setup_logging():
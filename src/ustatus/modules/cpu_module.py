@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, Dict, List, Tuple
 from gi.repository import Gtk, Gdk, GLib
 from ustatus.config import ModuleConfig
 from ustatus.graphics.line_graph import LineGraph
@@ -17,18 +17,12 @@ class CpuModule(Module):
         module_widget = CpuModuleWidget(bar_width=bar_width)
         modal_widget = CpuModuleModalWidget(history_length=history_length)
         self.history_length = history_length
-        self.cpu_history = History(
-            updater=self.update_cpu_history, maxlen=history_length
-        )
-        self.freq_history = History(
-            updater=self.update_freq_history, maxlen=history_length
-        )
-        self.temp_history = History(
-            updater=self.update_temp_history, maxlen=history_length
-        )
-        # self.fans_history = History(
-        # updater=self.update_fans_history, maxlen=history_length
-        # )
+        # Sampling is shared by every CPU module with the same settings, which
+        # also keeps psutil.cpu_percent from being reset by other callers
+        self.sampler = get_cpu_sampler(uptate_period_seconds, history_length)
+        self.cpu_history = self.sampler.cpu_history
+        self.freq_history = self.sampler.freq_history
+        self.temp_history = self.sampler.temp_history
         super().__init__(
             module_widget=module_widget,
             bar_width=bar_width,
@@ -36,14 +30,14 @@ class CpuModule(Module):
         )
         modal_button = self.get_popover_menubutton(modal_widget=modal_widget)
         self.module_widget.set_popover_menubutton(modal_button)
-        GLib.timeout_add(uptate_period_seconds * 1000, lambda: self._update())
-        GLib.timeout_add(uptate_period_seconds * 1000, lambda: self._update_modal())
+        self.sampler.add_listener(self._on_sample)
+        self.connect("destroy", lambda _: self.sampler.remove_listener(self._on_sample))
+
+    def _on_sample(self):
+        self._update()
+        self._update_modal()
 
     def _update(self):
-        self.cpu_history.update()
-        self.freq_history.update()
-        self.temp_history.update()
-        # self.fans_history.update()
         self.module_widget.update(self.cpu_history.peek_one())
         return True
 
@@ -56,6 +50,49 @@ class CpuModule(Module):
         self.modal_widget.push_freq_value(self.freq_history.peek_one())
         return True
 
+
+class CpuSampler:
+    """Samples CPU usage, frequency and temperature periodically while it has
+    listeners."""
+
+    def __init__(self, period_seconds: float, history_length: int):
+        self.period_seconds = period_seconds
+        self.cpu_history = History(
+            updater=self.update_cpu_history, maxlen=history_length
+        )
+        self.freq_history = History(
+            updater=self.update_freq_history, maxlen=history_length
+        )
+        self.temp_history = History(
+            updater=self.update_temp_history, maxlen=history_length
+        )
+        # self.fans_history = History(
+        # updater=self.update_fans_history, maxlen=history_length
+        # )
+        self.listeners: List[Callable] = []
+        self.timeout_id = None
+
+    def add_listener(self, listener: Callable):
+        self.listeners.append(listener)
+        if self.timeout_id is None:
+            self.timeout_id = GLib.timeout_add(self.period_seconds * 1000, self._sample)
+
+    def remove_listener(self, listener: Callable):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+        if not self.listeners and self.timeout_id is not None:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+
+    def _sample(self):
+        self.cpu_history.update()
+        self.freq_history.update()
+        self.temp_history.update()
+        # self.fans_history.update()
+        for listener in list(self.listeners):
+            listener()
+        return True
+
     def update_cpu_history(self):
         cpu_percents = [x / 100 for x in psutil.cpu_percent(interval=None, percpu=True)]
         return cpu_percents
@@ -209,6 +246,16 @@ class CpuModuleModalWidget(Gtk.Box):
             temp.push_value(v)
 
 
+_samplers: Dict[Tuple[float, int], CpuSampler] = dict()
+
+
+def get_cpu_sampler(period_seconds: float, history_length: int) -> CpuSampler:
+    key = (period_seconds, history_length)
+    if key not in _samplers:
+        _samplers[key] = CpuSampler(period_seconds, history_length)
+    return _samplers[key]
+
+
 class History:
     def __init__(
         self,
@@ -1,12 +1,15 @@
 import logging
-from typing import Any, Callable, Dict, Iterable, Optional, Set
-from dbus_next.aio.message_bus import MessageBus
-from dbus_next.constants import BusType
-from gi.repository import Gtk
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dbus_next.signature import Variant
+from ustatus.utils.art import get_art
+from ustatus.utils.mpris import MprisPlayer, get_mpris_registry
+from gi.repository import Gdk, Gtk, GLib
 from ustatus.module import Module
 
 import asyncio
 
+ART_SIZE = 96
+
 
 class MprisModule(Module):
     def __init__(
@@ -17,15 +20,27 @@ class MprisModule(Module):
 
         self._expand_widthwise()
 
-        self.modal_widget = MprisModalWidget(self._on_select_player_callback)
+        self.modal_widget = MprisModalWidget(
+            self._on_select_player_callback, self._on_seek_callback
+        )
         modal_menubutton = self.get_popover_menubutton(self.modal_widget)
         self.module_widget = MprisWidget(
             modal_menubutton, expander=lambda widget: self._expand_widthwise(widget)
         )
         self._expand_widthwise(self.module_widget)
 
-        self.bus_names: Set[str] = set()
+        self.registry = get_mpris_registry()
+        self.selected_player: Optional[MprisPlayer] = None
+        self.property_handlers: Dict[str, Callable[[Any], None]] = {
+            "PlaybackStatus": self.handle_change_playback_status,
+            "CanGoNext": self.handle_change_can_go_next,
+            "CanGoPrevious": self.handle_change_can_go_previous,
+            "Metadata": self.handle_change_metadata,
+            "Position": self.handle_change_position,
+            "CanSeek": self.handle_change_position,
+        }
         self.init_dbus_task = asyncio.create_task(self.__init_dbus__())
+        self.connect("destroy", lambda _: self.registry.remove_listener(self._on_event))
 
         self.set_module_widget(self.module_widget)
 
@@ -35,141 +50,117 @@ class MprisModule(Module):
     def _update_modal(self) -> bool:
         return True
 
-    def _on_name_owner_changed_callback(
-        self, name: str, old_owner: str, new_owner: str
-    ):
-        if name.startswith("org.mpris.MediaPlayer2"):
-            if new_owner:
-                self.bus_names.add(name)
-            else:
-                self.bus_names.remove(name)
-                if self.selected_player == name:
-                    self._on_select_player_callback(None)
-            self.modal_widget.set_items(self.bus_names)
+    def _on_event(self, event: str, player: MprisPlayer, changed: List[str]):
+        match event:
+            case "added":
+                self.modal_widget.add_item(player.bus_name)
+                if self.selected_player is None:
+                    self._select_player(player)
+            case "removed":
+                self.modal_widget.remove_item(player.bus_name)
+                if self.selected_player is player:
+                    self._select_player(self.registry.get_most_recent())
+            case "changed":
+                if self.selected_player is player:
+                    self._apply(player, changed)
 
     def _on_play_pause_callback(self):
-        if self.mpris_interface:
-            asyncio.create_task(self._on_play_pause())
-
-    async def _on_play_pause(self):
-        await self.mpris_interface.call_play_pause()
+        if self.selected_player:
+            asyncio.create_task(self.selected_player.interface.call_play_pause())
 
     def _on_next_callback(self):
-        if self.mpris_interface:
-            asyncio.create_task(self._on_next())
-
-    async def _on_next(self):
-        await self.mpris_interface.call_next()
+        if self.selected_player:
+            asyncio.create_task(self.selected_player.interface.call_next())
 
     def _on_prev_callback(self):
-        if self.mpris_interface:
-            asyncio.create_task(self._on_prev())
+        if self.selected_player:
+            asyncio.create_task(self.selected_player.interface.call_previous())
 
-    async def _on_prev(self):
-        await self.mpris_interface.call_previous()
+    def _on_seek_callback(self, position: int):
+        player = self.selected_player
+        track_id = player.get_track_id() if player else None
+        if track_id:
+            player.set_position(position)
+            asyncio.create_task(player.interface.call_set_position(track_id, position))
 
-    def _on_properties_changed_callback(self, bus_name, props, other):
-        asyncio.create_task(self.__on_properties_changed__(props))
+    def handle_change_playback_status(self, value: Optional[str]):
+        self.module_widget.set_playback_status(value or "Paused")
+        self.modal_widget.update_progress()
 
-    def handle_change_playback_status(self, value: str):
-        self.module_widget.set_playback_status(value)
+    def handle_change_position(self, _):
+        self.modal_widget.update_progress()
 
-    def handle_change_can_go_next(self, value: bool):
+    def handle_change_can_go_next(self, value: Optional[bool]):
         if value:
             self.module_widget.set_on_next(self._on_next_callback)
         else:
             self.module_widget.set_on_next(None)
 
-    def handle_change_can_go_previous(self, value: bool):
+    def handle_change_can_go_previous(self, value: Optional[bool]):
         if value:
             self.module_widget.set_on_previous(self._on_prev_callback)
         else:
             self.module_widget.set_on_previous(None)
 
-    async def __on_properties_changed__(self, props: Dict[str, Any]):
-        for key in props.keys():
-            if key == "PlaybackStatus":
-                playback_status = props[key].value
-                assert isinstance(playback_status, str)
-                self.handle_change_playback_status(playback_status)
-            elif key == "CanGoNext":
-                can_go_next = props[key].value
-                assert isinstance(can_go_next, bool)
-                self.handle_change_can_go_next(can_go_next)
-            elif key == "CanGoPrevious":
-                can_go_prev = props[key].value
-                assert isinstance(can_go_prev, bool)
-                self.handle_change_can_go_previous(can_go_prev)
-            elif key == "Metadata":
-                title = props[key].value.get("xesam:title")
-                if title:
-                    title = title.value
-                self.modal_widget.set_title(title)
-
-    def _on_select_player_callback(self, name):
-        asyncio.create_task(self._select_player(name))
-
-    async def _select_player(self, bus_name: Optional[str]):
-        logging.info(f"binding with {bus_name}")
-        obj_path = "/org/mpris/MediaPlayer2"
-        mpris_interface_name = "org.mpris.MediaPlayer2.Player"
-        props_interface_name = "org.freedesktop.DBus.Properties"
-
-        if bus_name:
-            introspection = await self.bus.introspect(bus_name, obj_path)
-            proxy_object = self.bus.get_proxy_object(bus_name, obj_path, introspection)
-            self.mpris_interface = proxy_object.get_interface(mpris_interface_name)
-            self.mpris_props_interface = proxy_object.get_interface(
-                props_interface_name
-            )
-
-            self.selected_player = bus_name
-            self.mpris_props_interface.on_properties_changed(
-                self._on_properties_changed_callback
-            )
+    def handle_change_metadata(self, value: Optional[Dict[str, Variant]]):
+        self.modal_widget.set_title(get_title(value))
+        self.modal_widget.set_art_url(get_art_url(value))
+        self.modal_widget.update_progress()
+
+    def _apply(self, player: MprisPlayer, keys: List[str]):
+        for key in keys:
+            handler = self.property_handlers.get(key)
+            if handler is not None:
+                handler(player.state.get(key))
+
+    def _on_select_player_callback(self, name: str):
+        player = self.registry.get_player(name)
+        if player is not None:
+            self._select_player(player)
+
+    def _select_player(self, player: Optional[MprisPlayer]):
+        """Switch to a player using its cached state, without any D-Bus calls."""
+        if player is self.selected_player:
+            return
+        logging.info(f"binding with {player.bus_name if player else None}")
+        self.selected_player = player
+        self.modal_widget.set_player(player)
+        if player is not None:
             self.module_widget.set_on_play_pause(self._on_play_pause_callback)
-            self.modal_widget.set_title(await self._get_title())
-
-            playback_status = await self.mpris_interface.get_playback_status()
-            self.handle_change_playback_status(playback_status)
-
-            can_go_next = await self.mpris_interface.get_can_go_next()
-            self.handle_change_can_go_next(can_go_next)
-
-            can_go_prev = await self.mpris_interface.get_can_go_previous()
-            self.handle_change_can_go_previous(can_go_prev)
+            self.modal_widget.set_active_item(player.bus_name)
+            self._apply(player, list(self.property_handlers))
         else:
-            self.mpris_interface = None
-            self.mpris_props_interface = None
-            self.selected_player = None
             self.module_widget.set_on_play_pause(None)
-            self.handle_change_playback_status("Paused")
+            self.handle_change_playback_status(None)
             self.handle_change_can_go_next(False)
-            self.handle_change_can_go_prev(False)
-
-    async def _get_title(self):
-        metadata: Dict = await self.mpris_interface.get_metadata()
-        title = metadata.get("xesam:title")
-        if title:
-            title = title.value
-        return title
+            self.handle_change_can_go_previous(False)
+            self.modal_widget.set_title(None)
+            self.modal_widget.set_art_url(None)
 
     async def __init_dbus__(self):
-        bus_name = "org.freedesktop.DBus"
-        obj_path = "/org/freedesktop/DBus"
+        self.registry.add_listener(self._on_event)
+        await self.registry.start()
+        for bus_name in self.registry.players:
+            self.modal_widget.add_item(bus_name)
+        self._select_player(self.registry.get_most_recent())
+
 
-        self.bus = await MessageBus(bus_type=BusType.SESSION).connect()
-        introspection = await self.bus.introspect(bus_name, obj_path)
-        proxy_object = self.bus.get_proxy_object(bus_name, obj_path, introspection)
-        self.dbus_interface = proxy_object.get_interface("org.freedesktop.DBus")
+def format_seconds(seconds: int) -> str:
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02}:{seconds:02}"
+    return f"{minutes}:{seconds:02}"
 
-        self.dbus_interface.on_name_owner_changed(self._on_name_owner_changed_callback)
 
-        names = await self.dbus_interface.call_boxlist_names()
-        for name in names:
-            if name.startswith("org.mpris.MediaPlayer2"):
-                self.bus_names.add(name)
-        self.modal_widget.set_items(self.bus_names)
+def get_art_url(metadata: Optional[Dict[str, Variant]]) -> Optional[str]:
+    art_url = metadata.get("mpris:artUrl") if metadata else None
+    return art_url.value if art_url is not None else None
+
+
+def get_title(metadata: Optional[Dict[str, Variant]]) -> Optional[str]:
+    title = metadata.get("xesam:title") if metadata else None
+    return title.value if title is not None else None
 
 
 class MprisWidget(Gtk.Grid):
@@ -177,6 +168,8 @@ class MprisWidget(Gtk.Grid):
         super().__init__()
         # self.set_column_homogeneous(False)
         # self.set_row_homogeneous(False)
+        self.playback_status = None
+        self.button_callbacks: Dict[Gtk.Button, Tuple[Callable, int]] = dict()
 
         self.button_play = Gtk.Button.new()
         self.button_play_image = Gtk.Image.new()
@@ -215,6 +208,9 @@ class MprisWidget(Gtk.Grid):
         self.attach(self.menubutton, 0, 1, 3, 1)
 
     def set_playback_status(self, playback_status):
+        if playback_status == self.playback_status:
+            return
+        self.playback_status = playback_status
         if playback_status == "Playing":
             self.button_play_image.set_from_icon_name(
                 "media-playback-pause-symbolic", Gtk.IconSize.SMALL_TOOLBAR
@@ -225,68 +221,168 @@ class MprisWidget(Gtk.Grid):
             )
 
     def set_on_play_pause(self, on_play_pause: Optional[Callable]):
-        if on_play_pause:
-            self.on_play_pause = on_play_pause
-            self.button_play_handler_id = self.button_play.connect(
-                "clicked", lambda button: on_play_pause()
-            )
-            self.button_play.set_sensitive(True)
-        else:
-            self.on_play_pause = None
-            self.button_play.disconnect(self.button_play_handler_id)
-            self.button_play.set_sensitive(False)
+        self._set_button_callback(self.button_play, on_play_pause)
 
     def set_on_next(self, on_next: Optional[Callable]):
-        if on_next:
-            self.on_next = on_next
-            self.button_next_handler_id = self.button_next.connect(
-                "clicked", lambda button: on_next()
-            )
-            self.button_next.set_sensitive(True)
-        else:
-            self.on_next = None
-            if hasattr(self, "button_next_handler_id"):
-                self.button_next.disconnect(self.button_next_handler_id)
-            self.button_next.set_sensitive(False)
+        self._set_button_callback(self.button_next, on_next)
 
     def set_on_previous(self, on_prev: Optional[Callable]):
-        if on_prev:
-            self.on_prev = on_prev
-            self.button_prev_handler_id = self.button_prev.connect(
-                "clicked", lambda button: on_prev()
-            )
-            self.button_prev.set_sensitive(True)
+        self._set_button_callback(self.button_prev, on_prev)
+
+    def _set_button_callback(self, button: Gtk.Button, callback: Optional[Callable]):
+        current_callback, handler_id = self.button_callbacks.get(button, (None, None))
+        if callback == current_callback:
+            return
+        if handler_id is not None:
+            button.disconnect(handler_id)
+        if callback:
+            handler_id = button.connect("clicked", lambda button: callback())
+            self.button_callbacks[button] = (callback, handler_id)
         else:
-            self.on_prev = None
-            if hasattr(self, "button_prev_handler_id"):
-                self.button_prev.disconnect(self.button_prev_handler_id)
-
-            self.button_prev.set_sensitive(False)
+            self.button_callbacks.pop(button, None)
+        button.set_sensitive(callback is not None)
 
 
 class MprisModalWidget(Gtk.Box):
-    def __init__(self, on_select):
+    def __init__(self, on_select, on_seek):
         super().__init__(orientation=Gtk.Orientation.VERTICAL)
+        self.items: List[str] = []
         self.combo = Gtk.ComboBoxText()
         self.add(self.combo)
         self.on_select = on_select
         self.combo.connect("changed", self.on_select_changed)
+        self.art_url: Optional[str] = None
+        self.art = Gtk.Image()
+        self.art.set_size_request(ART_SIZE, ART_SIZE)
+        self.art.set_no_show_all(True)
+        self.add(self.art)
+        self.title = None
         self.label_title = Gtk.Label()
         self.add(self.label_title)
 
+        self.player: Optional[MprisPlayer] = None
+        self.on_seek = on_seek
+        self.length: Optional[int] = None
+        self.shown_seconds: Optional[Tuple[int, int]] = None
+        self.tick_id: Optional[int] = None
+        self.progress = Gtk.Scale.new_with_range(Gtk.Orientation.HORIZONTAL, 0, 1, 1)
+        self.progress.set_draw_value(False)
+        self.progress.set_sensitive(False)
+        self.progress.connect("change-value", self._on_change_value)
+        self.add(self.progress)
+        self.label_position = Gtk.Label()
+        self.add(self.label_position)
+        self.connect("map", lambda _: self.update_progress())
+        self.connect("unmap", lambda _: self._stop_ticking())
+
+    def set_art_url(self, art_url: Optional[str]):
+        if art_url == self.art_url:
+            return
+        self.art_url = art_url
+        if art_url:
+            asyncio.create_task(self._load_art(art_url))
+        else:
+            self.art.hide()
+
+    async def _load_art(self, art_url: str):
+        scale = self.get_scale_factor()
+        pixbuf = await get_art(art_url, ART_SIZE * scale)
+        if art_url != self.art_url:
+            return
+        if pixbuf is None:
+            self.art.hide()
+        else:
+            self.art.set_from_surface(
+                Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None)
+            )
+            self.art.show()
+
+    def set_player(self, player: Optional[MprisPlayer]):
+        self.player = player
+        self.update_progress()
+
+    def update_progress(self):
+        """Redraw the progress bar, and keep redrawing it every frame while it
+        is visible and the player is playing.
+
+        The position between updates is interpolated by the player, so
+        redrawing makes no D-Bus calls.
+        """
+        player = self.player
+        length = player.get_length() if player is not None else None
+        if length != self.length:
+            self.length = length
+            self.progress.set_range(0, length / 1e6 if length else 1)
+        self.progress.set_sensitive(
+            bool(length and player is not None and player.state.get("CanSeek"))
+        )
+        self._draw_progress()
+        if (
+            self.get_mapped()
+            and player is not None
+            and player.state.get("PlaybackStatus") == "Playing"
+        ):
+            if self.tick_id is None:
+                self.tick_id = self.add_tick_callback(self._on_tick)
+        else:
+            self._stop_ticking()
+
+    def _stop_ticking(self):
+        if self.tick_id is not None:
+            self.remove_tick_callback(self.tick_id)
+            self.tick_id = None
+
+    def _on_tick(self, widget, frame_clock):
+        self._draw_progress()
+        return GLib.SOURCE_CONTINUE
+
+    def _draw_progress(self):
+        if self.player is None or not self.length:
+            self.progress.set_value(0)
+            shown_seconds = None
+        else:
+            position = self.player.get_position()
+            self.progress.set_value(position / 1e6)
+            shown_seconds = (position // 1000000, self.length // 1000000)
+        if shown_seconds != self.shown_seconds:
+            self.shown_seconds = shown_seconds
+            if shown_seconds is None:
+                self.label_position.set_label("")
+            else:
+                self.label_position.set_label(
+                    f"{format_seconds(shown_seconds[0])} / "
+                    f"{format_seconds(shown_seconds[1])}"
+                )
+
+    def _on_change_value(self, scale, scroll, value):
+        if self.length:
+            self.on_seek(int(min(max(value, 0), self.length / 1e6) * 1e6))
+            self.update_progress()
+        return False
+
     def on_select_changed(self, combo):
         active = self.combo.get_active_text()
         if active is not None:
             self.on_select(active)
 
     def set_title(self, title: Optional[str]):
+        if title == self.title:
+            return
+        self.title = title
         if title:
             self.label_title.set_label(f"Title: {title}")
         else:
             self.label_title.set_label("Title: Unknown")
 
-    def set_items(self, items: Iterable):
-        self.combo.remove_all()
-        for item in items:
-            self.combo.set_active_id(item)
-            self.combo.append_text(item)
+    def add_item(self, item: str):
+        if item not in self.items:
+            self.items.append(item)
+            self.combo.append(item, item)
+
+    def remove_item(self, item: str):
+        if item in self.items:
+            self.combo.remove(self.items.index(item))
+            self.items.remove(item)
+
+    def set_active_item(self, item: str):
+        self.combo.set_active_id(item)
@@ -1,8 +1,8 @@
 import logging
 from gi.repository import Gtk
 from ustatus.module import Module
-from dbus_next.aio.message_bus import MessageBus
-from dbus_next.constants import BusType
+from ustatus.utils.bus import get_system_bus
+from ustatus.utils.introspection import get_proxy_object
 from dbus_next.errors import DBusError
 from ustatus.utils.notifications import notify_error
 
@@ -55,9 +55,13 @@ class PowerProfilesModule(Module):
         obj_path = "/net/hadess/PowerProfiles"
         interface_name = "net.hadess.PowerProfiles"
 
-        self.bus = await MessageBus(bus_type=BusType.SYSTEM).connect()
-        introspection = await self.bus.introspect(bus_name, obj_path)
-        proxy_object = self.bus.get_proxy_object(bus_name, obj_path, introspection)
+        self.bus = await get_system_bus()
+        proxy_object = await get_proxy_object(
+            self.bus,
+            bus_name,
+            obj_path,
+            [interface_name, "org.freedesktop.DBus.Properties"],
+        )
         self.dbus_interface = proxy_object.get_interface(interface_name)
 
         self.properties_interface = proxy_object.get_interface(
@@ -1,11 +1,17 @@
 import asyncio
+import bisect
 import logging
 from ustatus.config import ModuleConfig
 from ustatus.module import Module
-from typing import Callable, Dict, Iterable, Optional
-from gi.repository import Gtk
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from gi.repository import Gtk, GLib
 
-from ustatus.utils.swaymsg import get_workspaces, subscribe, sway_command
+from ustatus.utils.swaymsg import (
+    get_event_hub,
+    get_tree_mirror,
+    get_workspaces,
+    sway_command,
+)
 
 
 class SwayModule(Module):
@@ -14,44 +20,134 @@ class SwayModule(Module):
         output: Optional[str],
         **kwargs,
     ):
-        super().__init__(**kwargs)
+        super().__init__(output=output, **kwargs)
         module_widget = SwayModuleWidget(
             gtk_orientation=self.gtk_orientation, on_select=self.on_select
         )
         self.set_module_widget(module_widget=module_widget)
-        self.output = output
+        # Net changes since the last frame: workspace id -> latest workspace,
+        # or None if it is gone. Applied once per frame clock tick.
+        self.pending_changes: Dict[int, Optional[Dict]] = dict()
+        self.pending_focus: Optional[int] = None
+        self.pending_snapshot: Optional[Iterable[Dict]] = None
+        self.pending_tree_changes: Set[int] = set()
+        self.flush_tick_id: Optional[int] = None
+        self.tree = get_tree_mirror() if self.config.show_window_count else None
+        self.subscriptions: List = []
+        self.destroyed = False
+        self.connect("destroy", lambda _: self._on_destroy())
         asyncio.create_task(self._init_async())
 
     def on_select(self, num):
         asyncio.create_task(sway_command(f"workspace number {num}"))
 
     async def _init_async(self):
+        # The module may be destroyed while any of these awaits is pending
         workspaces = await self._get_workspaces()
+        if self.destroyed:
+            return
 
         self.module_widget.setup_workspaces(workspaces)
 
-        async for event in subscribe(["workspace"]):
-            match event["change"]:
-                case "focus":
-                    if self._check_output(event["current"]):
-                        self.module_widget.focus_workspace(event["current"])
-                case "rename":
-                    if self._check_output(event["current"]):
-                        self.module_widget.rename_workspace(event["current"])
-                case "init":
-                    if self._check_output(event["current"]):
-                        self.module_widget.init_workspace(event["current"])
-                case "empty":
-                    if self._check_output(event["current"]):
-                        self.module_widget.remove_workspace(event["current"])
-                case "move":
-                    if self._check_output(event["current"]):
-                        self.module_widget.move_workspace(event["current"])
-                case "reload":
-                    self.module_widget.setup_workspaces(await self._get_workspaces())
-
-    def _check_output(self, workspace):
-        return (not self.output) or workspace["output"] == self.output
+        hub = get_event_hub()
+        self.subscriptions.append(
+            await hub.subscribe(
+                "workspace",
+                self._on_workspace_event,
+                output=self.output,
+                changes=["focus", "rename", "init", "empty", "urgent", "reload"],
+            )
+        )
+        if self.destroyed:
+            self._unsubscribe()
+            return
+        # Moves are needed from every output to notice workspaces leaving
+        self.subscriptions.append(
+            await hub.subscribe("workspace", self._on_move_event, changes=["move"])
+        )
+        if self.destroyed:
+            self._unsubscribe()
+            return
+
+        if self.tree is not None:
+            self.tree.add_listener(self._on_tree_changed)
+            await self.tree.start()
+            if self.destroyed:
+                return
+            self.pending_tree_changes.update(self.tree.workspaces)
+            self._schedule_flush()
+
+    def _on_destroy(self):
+        self.destroyed = True
+        self._unsubscribe()
+        if self.flush_tick_id is not None:
+            self.remove_tick_callback(self.flush_tick_id)
+            self.flush_tick_id = None
+
+    def _unsubscribe(self):
+        subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.unsubscribe()
+        if self.tree is not None:
+            self.tree.remove_listener(self._on_tree_changed)
+
+    def _on_tree_changed(self, workspace_id: int):
+        self.pending_tree_changes.add(workspace_id)
+        self._schedule_flush()
+
+    def _on_workspace_event(self, event):
+        workspace = event["current"]
+        match event["change"]:
+            case "focus":
+                self.pending_changes[workspace["id"]] = workspace
+                self.pending_focus = workspace["id"]
+            case "rename" | "init" | "urgent":
+                self.pending_changes[workspace["id"]] = workspace
+            case "empty":
+                self.pending_changes[workspace["id"]] = None
+            case "reload":
+                # The snapshot fetched after a reload supersedes earlier events
+                self.pending_changes.clear()
+                self.pending_focus = None
+                asyncio.create_task(self._reload_workspaces())
+                return
+        self._schedule_flush()
+
+    def _on_move_event(self, event):
+        workspace = event["current"]
+        if not self.output or workspace["output"] == self.output:
+            self.pending_changes[workspace["id"]] = workspace
+        else:
+            self.pending_changes[workspace["id"]] = None
+        self._schedule_flush()
+
+    async def _reload_workspaces(self):
+        self.pending_snapshot = list(await self._get_workspaces())
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self.flush_tick_id is None and not self.destroyed:
+            self.flush_tick_id = self.add_tick_callback(self._flush)
+
+    def _flush(self, widget, frame_clock):
+        self.flush_tick_id = None
+        if self.pending_snapshot is not None:
+            self.module_widget.setup_workspaces(self.pending_snapshot)
+            self.pending_tree_changes.update(self.module_widget.workspaces)
+            self.pending_snapshot = None
+        changes, self.pending_changes = self.pending_changes, dict()
+        focus, self.pending_focus = self.pending_focus, None
+        self.module_widget.apply_changes(changes, focus)
+        if self.tree is not None:
+            self.pending_tree_changes.update(
+                id for id, workspace in changes.items() if workspace is not None
+            )
+            for id in self.pending_tree_changes:
+                self.module_widget.set_window_state(
+                    id, self.tree.get_window_count(id), self.tree.is_urgent(id)
+                )
+            self.pending_tree_changes.clear()
+        return GLib.SOURCE_REMOVE
 
     async def _get_workspaces(self) -> Iterable[Dict]:
         workspaces = await get_workspaces()
@@ -60,10 +156,46 @@ class SwayModule(Module):
         return workspaces
 
 
-class WorkspaceLabel(Gtk.Label):
+class WorkspaceChild(Gtk.FlowBoxChild):
     def __init__(self, workspace):
-        super().__init__(label=workspace["name"])
+        super().__init__()
+        self.label = Gtk.Label()
+        self.add(self.label)
         self.workspace = workspace
+        self.window_count: Optional[int] = None
+        self.window_urgent = False
+        self._update_label()
+        self._update_urgent()
+
+    def set_workspace(self, workspace):
+        old_workspace = self.workspace
+        self.workspace = workspace
+        if old_workspace["name"] != workspace["name"]:
+            self._update_label()
+        if old_workspace.get("urgent") != workspace.get("urgent"):
+            self._update_urgent()
+
+    def set_window_state(self, window_count: int, urgent: bool):
+        if window_count != self.window_count:
+            self.window_count = window_count
+            self._update_label()
+        if urgent != self.window_urgent:
+            self.window_urgent = urgent
+            self._update_urgent()
+
+    def _update_label(self):
+        name = GLib.markup_escape_text(self.workspace["name"])
+        if self.window_count:
+            self.label.set_markup(f"{name}<sup>{self.window_count}</sup>")
+        else:
+            self.label.set_markup(name)
+
+    def _update_urgent(self):
+        style_context = self.get_style_context()
+        if self.window_urgent or self.workspace.get("urgent"):
+            style_context.add_class("urgent")
+        else:
+            style_context.remove_class("urgent")
 
     def get_num(self):
         return self.workspace["num"]
@@ -71,6 +203,9 @@ class WorkspaceLabel(Gtk.Label):
     def get_id(self):
         return self.workspace["id"]
 
+    def get_sort_key(self):
+        return (self.workspace["num"], self.workspace["id"])
+
 
 class SwayModuleWidget(Gtk.FlowBox):
     def __init__(
@@ -88,61 +223,43 @@ class SwayModuleWidget(Gtk.FlowBox):
                 raise Exception(f"Orientation {other} not recognized")
         super().__init__(orientation=orientation)
         self.on_select = on_select
-        self.workspaces: Dict = dict()
-        self.set_sort_func(
-            lambda child1, child2, *user_data: -1
-            if child1.get_child().get_num() < child2.get_child().get_num()
-            else 1
-        )
+        # Workspace id -> child, plus the (num, id) keys of all children kept in
+        # the same order as the children of the FlowBox, so no sort func needed
+        self.workspaces: Dict[int, WorkspaceChild] = dict()
+        self.sorted_keys: List[Tuple[int, int]] = []
         self.set_homogeneous(True)
         self.connect("child-activated", self._on_child_activated)
 
         if initial_workspaces:
             self.setup_workspaces(initial_workspaces)
 
-    def setup_workspaces(self, initial_workspaces):
-        self._clear()
-        for ws in initial_workspaces:
-            self.init_workspace(ws)
+    def setup_workspaces(self, workspaces):
+        """Diff the given workspaces against the current ones, only touching
+        the children that changed."""
+        new_workspaces = {ws["id"]: ws for ws in workspaces}
+        for id in [id for id in self.workspaces if id not in new_workspaces]:
+            self._remove_child(id)
+        for ws in new_workspaces.values():
+            if ws["id"] in self.workspaces:
+                self._update_child(ws)
+            else:
+                self._add_child(ws)
+        for ws in new_workspaces.values():
             if ws["focused"]:
                 self.focus_workspace(ws)
-        self.show_all()
-
-    def init_workspace(self, workspace):
-        id = workspace["id"]
-        if id in self.workspaces:
-            raise Exception(
-                f"Workspace {workspace['id']}:{workspace['num']}:{workspace['name']} already exists"
-            )
-        label = WorkspaceLabel(workspace=workspace)
-        label.show()
-        self.workspaces[id] = label
-        self.add(label)
 
-    def move_workspace(self, workspace):
-        """Workspace is moved into current output"""
-        id = workspace["id"]
-        if id not in self.workspaces:
-            label = WorkspaceLabel(workspace=workspace)
-            label.show()
-            self.workspaces[id] = label
-            self.add(label)
-
-    def remove_workspace(self, workspace):
-        if workspace["id"] not in self.workspaces:
-            raise Exception(
-                f"Workspace {workspace['id']}:{workspace['num']}:{workspace['name']} does not exist, can't be removed!"
-            )
-        label = self.workspaces.pop(workspace["id"])
-        self.remove(label)
-
-    def rename_workspace(self, workspace):
-        id = workspace["id"]
-        if id not in self.workspaces:
-            raise Exception(
-                f"Workspace {workspace['id']}:{workspace['num']}:{workspace['name']} does not exist, can't be renamed!"
-            )
-        self.workspaces[id].set_label(workspace["name"])
+    def apply_changes(self, changes: Dict[int, Optional[Dict]], focus: Optional[int]):
+        """Apply net workspace changes (None meaning removal), then focus."""
+        for id, workspace in changes.items():
+            if workspace is None:
+                if id in self.workspaces:
+                    self._remove_child(id)
+            elif id in self.workspaces:
+                self._update_child(workspace)
+            else:
+                self._add_child(workspace)
+        if focus is not None and focus in self.workspaces:
+            self.select_child(self.workspaces[focus])
 
     def focus_workspace(self, workspace):
         id = workspace["id"]
@@ -150,21 +267,45 @@ class SwayModuleWidget(Gtk.FlowBox):
             raise Exception(
                 f"Workspace {workspace['id']}:{workspace['num']}:{workspace['name']} does not exist, can't be focused!"
             )
-        self.select_child(self._find_child_with_label(self.workspaces[id]))
-
-    def _find_child_with_label(self, label):
-        for child in self.get_children():
-            if child.get_child() == label:
-                return child
-        raise Exception("Child not found")
-
-    def _clear(self):
-        while True:
-            try:
-                _, label = self.workspaces.popitem()
-                self.remove(label)
-            except KeyError:
-                break
+        self.select_child(self.workspaces[id])
+
+    def set_window_state(self, id: int, window_count: int, urgent: bool):
+        if id in self.workspaces:
+            self.workspaces[id].set_window_state(window_count, urgent)
+
+    def _add_child(self, workspace):
+        child = WorkspaceChild(workspace=workspace)
+        child.show_all()
+        self.workspaces[workspace["id"]] = child
+        self._insert_sorted(child)
+
+    def _remove_child(self, id):
+        child = self.workspaces.pop(id)
+        self._remove_sorted(child)
+        child.destroy()
+
+    def _update_child(self, workspace):
+        child = self.workspaces[workspace["id"]]
+        if child.workspace["num"] != workspace["num"]:
+            selected = child.is_selected()
+            self._remove_sorted(child)
+            child.set_workspace(workspace)
+            self._insert_sorted(child)
+            if selected:
+                self.select_child(child)
+        else:
+            child.set_workspace(workspace)
+
+    def _insert_sorted(self, child: WorkspaceChild):
+        key = child.get_sort_key()
+        position = bisect.bisect_left(self.sorted_keys, key)
+        self.sorted_keys.insert(position, key)
+        self.insert(child, position)
+
+    def _remove_sorted(self, child: WorkspaceChild):
+        key = child.get_sort_key()
+        del self.sorted_keys[bisect.bisect_left(self.sorted_keys, key)]
+        self.remove(child)
 
     def _on_child_activated(self, flow_box, child):
-        self.on_select(child.get_child().get_num())
+        self.on_select(child.get_num())
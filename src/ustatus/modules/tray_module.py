@@ -1,28 +1,42 @@
 import logging
-from typing import Callable, Set
+import math
+from typing import Awaitable, Callable, Dict, Optional, Set
 from dbus_next.constants import PropertyAccess
+from dbus_next.errors import DBusError
 from dbus_next.message import Message
+import gi
+
+gi.require_version("DbusmenuGtk3", "0.4")
 from gi.repository import Gtk, GLib, DbusmenuGtk3, Gdk
 from ustatus.config import ModuleConfig
 from ustatus.module import Module
 from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.signature import Variant
 from dbus_next.aio.message_bus import MessageBus
-from multiprocessing import Process
+from ustatus.utils.bus import get_bus_manager, get_session_bus
+from ustatus.utils.introspection import get_proxy_object
+from ustatus.utils.pixmaps import as_pixmaps, compose_overlay, pixbuf_from_pixmaps
 
 import asyncio
 
+TRAY_INIT_CONCURRENCY = 4
+TRAY_ITEM_INIT_TIMEOUT_SECONDS = 5
+TRAY_ICON_SIZE = 24
+
 
 class TrayModule(Module):
     def __init__(
         self, gtk_orientation: Gtk.Orientation, update_period_seconds=3, **kwargs
     ) -> None:
         self.module_widget = TrayWidget(orientation=gtk_orientation)
+        self.init_semaphore = asyncio.Semaphore(TRAY_INIT_CONCURRENCY)
+        self.registered_items: Set[str] = set()
         super().__init__(
             module_widget=self.module_widget, gtk_orientation=gtk_orientation, **kwargs
         )
 
         self.init_task = asyncio.create_task(self._init_async())
+        self.connect("destroy", lambda _: self._on_destroy())
 
         self.show_all()
         self.module_widget.show_all()
@@ -32,58 +46,92 @@ class TrayModule(Module):
         return True
 
     async def _init_async(self):
-        await self._init_watcher()
-        await self._init_host()
+        await init_tray_services()
         await self._attach_to_watcher()
 
+    def _on_destroy(self):
+        self.init_task.cancel()
+        for merged_string in list(self.module_widget.items):
+            self.module_widget.remove_item(merged_string)
+        self.registered_items.clear()
+
     async def _attach_to_watcher(self):
-        bus = await MessageBus().connect()
-        introspection = await bus.introspect(
-            "org.kde.StatusNotifierWatcher", "/StatusNotifierWatcher"
-        )
-        proxy_object = bus.get_proxy_object(
-            "org.kde.StatusNotifierWatcher", "/StatusNotifierWatcher", introspection
+        bus = await get_session_bus()
+        proxy_object = await get_proxy_object(
+            bus,
+            "org.kde.StatusNotifierWatcher",
+            "/StatusNotifierWatcher",
+            ["org.kde.StatusNotifierWatcher"],
         )
         interface = proxy_object.get_interface("org.kde.StatusNotifierWatcher")
-        for merged_string in await interface.get_registered_status_notifier_items():
-            logging.info(f"{merged_string}")
-            await self._new_item(merged_string)
-
-        interface.on_status_notifier_item_registered(
-            lambda merged_string: self._new_item_callback(merged_string)
-        )
-
-        interface.on_status_notifier_item_unregistered(
-            lambda merged_string: self.__item_removed__(merged_string)
-        )
-
-        await bus.wait_for_disconnect()
+        # Connected before reading the initial items so that none registered
+        # or unregistered meanwhile are missed; registered_items dedups them
+        interface.on_status_notifier_item_registered(self._new_item_callback)
+        interface.on_status_notifier_item_unregistered(self.__item_removed__)
+
+        try:
+            await asyncio.gather(
+                *(
+                    self._new_item(merged_string)
+                    for merged_string in await interface.get_registered_status_notifier_items()
+                ),
+                return_exceptions=True,
+            )
+            await bus.wait_for_disconnect()
+        finally:
+            interface.off_status_notifier_item_registered(self._new_item_callback)
+            interface.off_status_notifier_item_unregistered(self.__item_removed__)
 
     def _new_item_callback(self, merged_string: str):
         asyncio.create_task(self._new_item(merged_string))
 
     async def _new_item(self, merged_string: str):
+        if merged_string in self.registered_items:
+            return
+        self.registered_items.add(merged_string)
         bus_name, obj_path = service_path_from_merged(merged_string)
-        item = await TrayItem.init(bus_name, obj_path)
-        self.module_widget.new_item(item)
+        async with self.init_semaphore:
+            try:
+                item = await asyncio.wait_for(
+                    TrayItem.init(
+                        bus_name,
+                        obj_path,
+                        self.config.min_refresh_interval_ms / 1000,
+                        self.config.menu_idle_timeout_seconds,
+                    ),
+                    TRAY_ITEM_INIT_TIMEOUT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                logging.warning(f"Tray item {merged_string} timed out, skipping it")
+                self.registered_items.discard(merged_string)
+                return
+            except DBusError as e:
+                logging.warning(f"Failed to initialize tray item {merged_string}: {e}")
+                self.registered_items.discard(merged_string)
+                return
+            except Exception:
+                # One misbehaving item must not break the rest of the tray
+                logging.exception(f"Failed to initialize tray item {merged_string}")
+                self.registered_items.discard(merged_string)
+                return
+        if merged_string not in self.registered_items:
+            # Unregistered while it was being initialized
+            item.close()
+            return
+        logging.info(f"New tray item {merged_string}")
+        try:
+            self.module_widget.new_item(merged_string, item)
+        except Exception:
+            logging.exception(f"Failed to show tray item {merged_string}")
+            self.registered_items.discard(merged_string)
+            if merged_string in self.module_widget.items:
+                self.module_widget.remove_item(merged_string)
+            else:
+                item.close()
 
     def __item_removed__(self, merged_string: str):
-        bus_name, obj_path = service_path_from_merged(merged_string)
-        self.module_widget.remove_item(bus_name)
-
-    async def _init_watcher(self):
-        bus = await MessageBus().connect()
-        interface = StatusNotifierWatcher("org.kde.StatusNotifierWatcher", bus)
-        bus.export("/StatusNotifierWatcher", interface)
-        asyncio.create_task(bus.request_name("org.kde.StatusNotifierWatcher"))
-        logging.info("Watcher service initialized")
-
-    async def _init_host(self):
-        bus = await MessageBus().connect()
-        interface = StatusNotifierHost("org.kde.StatusNotifierHost")
-        bus.export("/StatusNotifierHost", interface)
-        asyncio.create_task(bus.request_name("org.kde.StatusNotifierHost-ustatus"))
-        logging.info("Host service initialized")
+        self.registered_items.discard(merged_string)
+        self.module_widget.remove_item(merged_string)
 
 
 class TrayWidget(Gtk.FlowBox):
@@ -100,14 +148,15 @@ class TrayWidget(Gtk.FlowBox):
     def update(self):
         self.show_all()
 
-    def new_item(self, item):
-        self.items[item.bus_name] = item
+    def new_item(self, merged_string, item):
+        self.items[merged_string] = item
         self.add(item)
         self.update()
 
-    def remove_item(self, bus_name):
-        if bus_name in self.items:
-            item = self.items[bus_name]
+    def remove_item(self, merged_string):
+        if merged_string in self.items:
+            item = self.items.pop(merged_string)
+            item.close()
             self.remove(item)
 
 
@@ -118,8 +167,18 @@ class TrayItem(Gtk.Box):
         super().__init__(orientation=Gtk.Orientation.HORIZONTAL)
 
     @classmethod
-    async def init(cls, bus_name, obj_path):
+    async def init(
+        cls,
+        bus_name,
+        obj_path,
+        refresh_interval_seconds: float = 0,
+        menu_idle_timeout_seconds: int = 0,
+    ):
         obj = cls()
+        obj.menu = None
+        obj.menu_idle_timeout_seconds = menu_idle_timeout_seconds
+        obj.menu_teardown_id = None
+        obj.menu_layout_handler = None
 
         obj.button_icon = Gtk.Image()
 
@@ -132,66 +191,310 @@ class TrayItem(Gtk.Box):
         obj.add(obj.button)
         obj.bus_name = bus_name
         obj.obj_path = obj_path
-        obj.bus = await MessageBus().connect()
-        introspection = await obj.bus.introspect(bus_name, obj_path)
-        proxy_object = obj.bus.get_proxy_object(bus_name, obj_path, introspection)
+        obj.bus = await get_session_bus()
+        proxy_object = await get_proxy_object(
+            obj.bus,
+            bus_name,
+            obj_path,
+            [cls.interface_name, "org.freedesktop.DBus.Properties"],
+        )
         obj.interface = proxy_object.get_interface(cls.interface_name)
-        await obj.__get_id__()
-        await obj.__get_title__()
-        await obj.__get_icon_name__()
-        await obj.__get_menu__()
-
-        obj.interface.on_new_title(lambda: obj.__on_new_title_callback__())
-        obj.interface.on_new_icon(lambda: obj.__on_new_icon_callback__())
+        obj.properties_interface = proxy_object.get_interface(
+            "org.freedesktop.DBus.Properties"
+        )
+        obj.title_refresh = RefreshCoalescer(
+            obj.__get_title__, refresh_interval_seconds
+        )
+        obj.icon_refresh = RefreshCoalescer(obj.__get_icon__, refresh_interval_seconds)
+        obj.icon_state = None
+        obj.shown_icon = None
+
+        manager = get_bus_manager()
+        obj.signal_handlers = []
+        signal_callbacks = {
+            "NewTitle": lambda _: obj.title_refresh.request(),
+            "NewIcon": lambda _: obj.icon_refresh.request(),
+            "NewAttentionIcon": lambda _: obj.icon_refresh.request(),
+            "NewOverlayIcon": lambda _: obj.icon_refresh.request(),
+            "NewStatus": lambda msg: obj.__on_new_status__(msg.body[0]),
+        }
+        try:
+            for member, callback in signal_callbacks.items():
+                obj.signal_handlers.append(
+                    await manager.add_signal_handler(
+                        cls.interface_name,
+                        member,
+                        callback,
+                        sender=bus_name,
+                        path=obj_path,
+                    )
+                )
+            properties = await obj.properties_interface.call_get_all(cls.interface_name)
+        except BaseException:
+            obj.close()
+            raise
+        obj.__set_properties__(properties)
+        obj.__setup_menu__()
+        obj.connect("notify::scale-factor", lambda *_: obj.__update_icon__())
 
         return obj
 
-    def __on_new_title_callback__(self):
-        asyncio.create_task(self.__get_title__())
-
-    def __on_new_icon_callback__(self):
-        asyncio.create_task(self.__get_icon_name__())
-
-    async def __get_id__(self):
-        self.id = await self.interface.get_id()
+    def close(self):
+        for handler in self.signal_handlers:
+            handler.remove()
+        self.signal_handlers = []
+        self.title_refresh.cancel()
+        self.icon_refresh.cancel()
+        self.__destroy_menu__()
+
+    def __on_new_status__(self, status: str):
+        if status != self.status:
+            self.status = status
+            self.__update_icon__()
+
+    def __set_properties__(self, properties: Dict[str, Variant]):
+        def value(name):
+            variant = properties.get(name)
+            return variant.value if variant is not None else None
+
+        self.id = value("Id")
+        self.title = value("Title")
+        self.menu_path = value("Menu")
+        self.status = value("Status")
+        self.__set_icon_properties__(properties)
+
+    def __set_icon_properties__(self, properties: Dict[str, Variant]):
+        def value(name):
+            variant = properties.get(name)
+            return variant.value if variant is not None else None
+
+        icon_state = (
+            value("IconName"),
+            as_pixmaps(value("IconPixmap")),
+            value("AttentionIconName"),
+            as_pixmaps(value("AttentionIconPixmap")),
+            as_pixmaps(value("OverlayIconPixmap")),
+        )
+        if icon_state == self.icon_state:
+            return
+        self.icon_state = icon_state
+        (
+            self.icon_name,
+            self.icon_pixmap,
+            self.attention_icon_name,
+            self.attention_icon_pixmap,
+            self.overlay_icon_pixmap,
+        ) = icon_state
+        self.__update_icon__()
 
     async def __get_title__(self):
         self.title = await self.interface.get_title()
 
-    async def __get_icon_name__(self):
-        self.icon_name = await self.interface.get_icon_name()
-        self.button_icon.set_from_icon_name(self.icon_name, Gtk.IconSize.LARGE_TOOLBAR)
-        self.show_all()
+    async def __get_icon__(self):
+        self.__set_icon_properties__(
+            await self.properties_interface.call_get_all(self.interface_name)
+        )
 
-    async def __get_menu_path__(self):
-        self.menu_path = await self.interface.get_menu()
+    def __update_icon__(self):
+        icon_name, pixmap = self.icon_name, self.icon_pixmap
+        if self.status == "NeedsAttention" and (
+            self.attention_icon_name or self.attention_icon_pixmap
+        ):
+            icon_name = self.attention_icon_name
+            pixmap = self.attention_icon_pixmap
+        if icon_name or not pixmap:
+            if self.shown_icon == icon_name:
+                return
+            self.shown_icon = icon_name
+            self.button_icon.set_from_icon_name(icon_name, Gtk.IconSize.LARGE_TOOLBAR)
+        else:
+            scale = self.get_scale_factor()
+            pixbuf = pixbuf_from_pixmaps(pixmap, TRAY_ICON_SIZE * scale)
+            overlay = pixbuf_from_pixmaps(
+                self.overlay_icon_pixmap, TRAY_ICON_SIZE * scale
+            )
+            # Decoded pixbufs are cached, so an unchanged icon is the same object
+            shown_icon = (pixbuf, overlay, scale)
+            if pixbuf is None or self.shown_icon == shown_icon:
+                return
+            self.shown_icon = shown_icon
+            if overlay is not None:
+                pixbuf = compose_overlay(pixbuf, overlay)
+            self.button_icon.set_from_surface(
+                Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, None)
+            )
+
+    def __setup_menu__(self):
+        if not self.menu_path:
+            return
+        self.button.connect("clicked", self.__on_button_clicked__)
 
-    async def __get_menu__(self):
-        await self.__get_menu_path__()
+    def __create_menu__(self):
+        # The menu mirrors the application's whole menu layout over D-Bus, so
+        # it only exists while it is in use
         self.menu = DbusmenuGtk3.Menu.new(self.bus_name, self.menu_path)
         self.menu.attach_to_widget(self.button)
         self.menu.set_take_focus(True)
-        self.button.connect("clicked", self.__on_button_clicked__)
-        self.show_all()
+        self.menu.connect("deactivate", lambda _: self.__schedule_menu_teardown__())
+
+    def __destroy_menu__(self):
+        if self.menu_teardown_id is not None:
+            GLib.source_remove(self.menu_teardown_id)
+            self.menu_teardown_id = None
+        if self.menu_layout_handler is not None:
+            client, handler_id = self.menu_layout_handler
+            client.disconnect(handler_id)
+            self.menu_layout_handler = None
+        if self.menu is not None:
+            self.menu.detach()
+            self.menu.destroy()
+            self.menu = None
+
+    def __schedule_menu_teardown__(self):
+        if self.menu_teardown_id is not None:
+            GLib.source_remove(self.menu_teardown_id)
+        self.menu_teardown_id = GLib.timeout_add_seconds(
+            self.menu_idle_timeout_seconds, self.__on_menu_idle__
+        )
+
+    def __on_menu_idle__(self):
+        self.menu_teardown_id = None
+        self.__destroy_menu__()
+        return GLib.SOURCE_REMOVE
 
     def __on_button_clicked__(self, widget):
+        if self.menu_layout_handler is not None:
+            # Already waiting for the layout to pop up
+            return
+        if self.menu is None:
+            self.__create_menu__()
+            # The layout arrives asynchronously, pop up once it is known. The
+            # menu is still released if it never arrives.
+            client = self.menu.get_client()
+
+            def on_layout_updated(_):
+                client.disconnect(self.menu_layout_handler[1])
+                self.menu_layout_handler = None
+                self.__popup_menu__(widget)
+
+            self.menu_layout_handler = (
+                client,
+                client.connect("layout-updated", on_layout_updated),
+            )
+            self.__schedule_menu_teardown__()
+        else:
+            self.__popup_menu__(widget)
+
+    def __popup_menu__(self, widget):
+        if self.menu is None:
+            return
+        if self.menu_teardown_id is not None:
+            GLib.source_remove(self.menu_teardown_id)
+            self.menu_teardown_id = None
         self.menu.popup_at_widget(
             widget, Gdk.Gravity.CENTER, Gdk.Gravity.NORTH_WEST, None
         )
 
 
+class RefreshCoalescer:
+    """Runs fetch for a burst of requests with at most one call in flight.
+
+    Requests that arrive while fetch runs are folded into one trailing call,
+    and calls are spaced at least interval_seconds apart.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable], interval_seconds: float):
+        self.fetch = fetch
+        self.interval_seconds = interval_seconds
+        self.pending = False
+        self.last_run = -math.inf
+        self.task = None
+
+    def request(self):
+        self.pending = True
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        self.pending = False
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.pending:
+                delay = self.last_run + self.interval_seconds - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.pending = False
+                self.last_run = loop.time()
+                try:
+                    await self.fetch()
+                except DBusError as e:
+                    logging.warning(f"Tray item refresh failed: {e}")
+        finally:
+            self.task = None
+
+
 class StatusNotifierWatcher(ServiceInterface):
+    """StatusNotifierWatcher that indexes items and hosts by the unique bus
+    name of their owner, so everything an application registered is dropped
+    as soon as it disconnects."""
+
     def __init__(self, name, bus: MessageBus):
         super().__init__(name)
         self.name = name
-        self._items_registered: Set = set()
-        self._hosts_registered: Set = set()
+        self._items_by_owner: Dict[str, Dict[str, None]] = dict()
+        self._item_owners: Dict[str, str] = dict()
+        self._host_owners: Dict[str, Set[str]] = dict()
+        self.name_owner_handler = None
         bus.add_message_handler(self.register_sni_handler)
 
+    async def start(self):
+        self.name_owner_handler = await get_bus_manager().add_signal_handler(
+            "org.freedesktop.DBus",
+            "NameOwnerChanged",
+            self._on_name_owner_changed,
+            sender="org.freedesktop.DBus",
+        )
+
     def register_sni_handler(self, msg: Message):
-        if msg.interface == self.name and msg.member == "RegisterStatusNotifierItem":
-            self._items_registered.add(f"{msg.sender}{msg.body[0]}")
-            return Message.new_method_return(msg, "", [])
+        if msg.interface != self.name or msg.sender is None:
+            return
+        match msg.member:
+            case "RegisterStatusNotifierItem":
+                self._register_item(msg.sender, msg.body[0])
+                return Message.new_method_return(msg, "", [])
+            case "RegisterStatusNotifierHost":
+                self._register_host(msg.sender, msg.body[0])
+                return Message.new_method_return(msg, "", [])
+
+    def _register_item(self, owner: str, service: str):
+        # Items register either an object path on their own connection or a
+        # bus name exporting /StatusNotifierItem
+        merged = f"{owner}{service}" if service.startswith("/") else service
+        if merged in self._item_owners:
+            return
+        self._item_owners[merged] = owner
+        self._items_by_owner.setdefault(owner, dict())[merged] = None
+        self.StatusNotifierItemRegistered(merged)
+
+    def _register_host(self, owner: str, service: str):
+        first_host = not self._host_owners
+        self._host_owners.setdefault(owner, set()).add(service)
+        if first_host:
+            self.StatusNotifierHostRegistered()
+
+    def _on_name_owner_changed(self, msg: Message):
+        name, old_owner, new_owner = msg.body
+        if new_owner or not old_owner:
+            return
+        self._host_owners.pop(old_owner, None)
+        for merged in self._items_by_owner.pop(old_owner, ()):
+            del self._item_owners[merged]
+            self.StatusNotifierItemUnregistered(merged)
 
     @method()
     def RegisterStatusNotifierItem(self, service: "s"):
@@ -199,26 +502,63 @@ class StatusNotifierWatcher(ServiceInterface):
 
     @method()
     def RegisterStatusNotifierHost(self, service: "s"):
-        self._hosts_registered.add(service)
+        pass
 
     @dbus_property(access=PropertyAccess.READ)
     def RegisteredStatusNotifierItems(self) -> "as":
-        return list(self._items_registered)
+        return list(self._item_owners)
 
     @dbus_property(access=PropertyAccess.READ)
     def IsStatusNotifierHostRegistered(self) -> "b":
-        return len(self._hosts_registered) > 0
+        return len(self._host_owners) > 0
 
     @dbus_property(access=PropertyAccess.READ)
     def ProtocolVersion(self) -> "i":
         return 0
 
+    @signal()
+    def StatusNotifierItemRegistered(self, service) -> "s":
+        return service
+
+    @signal()
+    def StatusNotifierItemUnregistered(self, service) -> "s":
+        return service
+
+    @signal()
+    def StatusNotifierHostRegistered(self):
+        pass
+
 
 class StatusNotifierHost(ServiceInterface):
     def __init__(self, name):
         super().__init__(name)
 
 
+_services_task: Optional[asyncio.Task] = None
+
+
+async def init_tray_services():
+    """Export the watcher and host once per process, however many tray
+    modules there are."""
+    global _services_task
+    if _services_task is None:
+        _services_task = asyncio.create_task(_init_services())
+    await asyncio.shield(_services_task)
+
+
+async def _init_services():
+    bus = await get_session_bus()
+    watcher = StatusNotifierWatcher("org.kde.StatusNotifierWatcher", bus)
+    await watcher.start()
+    bus.export("/StatusNotifierWatcher", watcher)
+    asyncio.create_task(bus.request_name("org.kde.StatusNotifierWatcher"))
+    logging.info("Watcher service initialized")
+    host = StatusNotifierHost("org.kde.StatusNotifierHost")
+    bus.export("/StatusNotifierHost", host)
+    asyncio.create_task(bus.request_name("org.kde.StatusNotifierHost-ustatus"))
+    logging.info("Host service initialized")
+
+
 def service_path_from_merged(merged: str):
     split_list = merged.split("/", maxsplit=1)
     if len(split_list) == 1:
@@ -1,21 +1,95 @@
 import ustatus
+from typing import Callable, Dict, List, Optional
 from ustatus.module import Module
+from dbus_next.aio.message_bus import MessageBus
+from dbus_next.message import Message
 from dbus_next.service import ServiceInterface, method, dbus_property, signal
 from dbus_next.signature import Variant
-from dbus_next.aio.message_bus import MessageBus
+from ustatus.utils.bus import get_session_bus
 import asyncio
 import logging
 
+REMOTE_SERVICE_NAME = "ustatus.UstatusRemoteService"
+REMOTE_SERVICE_PATH = "/UstatusRemoteService"
+DAEMON_SERVICE_NAME = "ustatus.UstatusDaemon"
+DAEMON_SERVICE_PATH = "/UstatusDaemon"
+
+# Remote services of the bars in this process, by bar name. They all share
+# one object path, and calls are routed by the bus name they were sent to
+_services: Dict[str, "UstatusRemoteService"] = dict()
+_router_task: Optional[asyncio.Task] = None
+
 
 async def init_service(on_hide, on_show, bar_name):
-    bus = await MessageBus().connect()
-    interface = UstatusRemoteService("ustatus.UstatusRemoteService", on_show, on_hide)
-    bus.export("/UstatusRemoteService", interface)
+    bus = await get_session_bus()
+    await _ensure_router(bus)
+    _services[bar_name] = UstatusRemoteService(REMOTE_SERVICE_NAME, on_show, on_hide)
     # now that we are ready to handle requests, we can request name from D-Bus
-    asyncio.create_task(bus.request_name(f"ustatus.UstatusRemoteService.{bar_name}"))
+    asyncio.create_task(bus.request_name(f"{REMOTE_SERVICE_NAME}.{bar_name}"))
     logging.info("Remote service initialized")
 
 
+async def remove_service(bar_name):
+    if _services.pop(bar_name, None) is None:
+        return
+    bus = await get_session_bus()
+    await bus.release_name(f"{REMOTE_SERVICE_NAME}.{bar_name}")
+    logging.info(f"Remote service of {bar_name} removed")
+
+
+async def init_daemon_service(on_create_bar, on_destroy_bar, on_list_bars):
+    bus = await get_session_bus()
+    interface = UstatusDaemonService(
+        DAEMON_SERVICE_NAME, on_create_bar, on_destroy_bar, on_list_bars
+    )
+    bus.export(DAEMON_SERVICE_PATH, interface)
+    asyncio.create_task(bus.request_name(DAEMON_SERVICE_NAME))
+    logging.info("Daemon service initialized")
+
+
+async def _ensure_router(bus: MessageBus):
+    global _router_task
+    if _router_task is None:
+        _router_task = asyncio.create_task(_init_router(bus))
+    await asyncio.shield(_router_task)
+
+
+async def _init_router(bus: MessageBus):
+    # Exported only so that the interface can be introspected; calls are
+    # answered by _route
+    bus.export(
+        REMOTE_SERVICE_PATH,
+        UstatusRemoteService(REMOTE_SERVICE_NAME, lambda: None, lambda: None),
+    )
+    bus.add_message_handler(_route)
+
+
+def _route(msg: Message):
+    if msg.path != REMOTE_SERVICE_PATH or msg.interface != REMOTE_SERVICE_NAME:
+        return
+    prefix = f"{REMOTE_SERVICE_NAME}."
+    if msg.destination and msg.destination.startswith(prefix):
+        service = _services.get(msg.destination[len(prefix) :])
+    elif len(_services) == 1:
+        service = next(iter(_services.values()))
+    else:
+        service = None
+    if service is None:
+        return Message.new_error(
+            msg, f"{REMOTE_SERVICE_NAME}.Error.UnknownBar", "No such bar"
+        )
+    match msg.member:
+        case "Hide":
+            service.Hide()
+        case "Show":
+            service.Show()
+        case "ToggleVisible":
+            service.ToggleVisible()
+        case _:
+            return
+    return Message.new_method_return(msg, "", [])
+
+
 class UstatusRemoteService(ServiceInterface):
     def __init__(self, name, on_show, on_hide):
         super().__init__(name)
@@ -43,3 +117,31 @@ class UstatusRemoteService(ServiceInterface):
         else:
             self.on_show()
         self.is_shown = not self.is_shown
+
+
+class UstatusDaemonService(ServiceInterface):
+    def __init__(
+        self,
+        name,
+        on_create_bar: Callable[[str, str], str],
+        on_destroy_bar: Callable[[str], None],
+        on_list_bars: Callable[[], List[str]],
+    ):
+        super().__init__(name)
+        self.on_create_bar = on_create_bar
+        self.on_destroy_bar = on_destroy_bar
+        self.on_list_bars = on_list_bars
+
+    @method()
+    def CreateBar(self, bar_name: "s", output: "s") -> "s":
+        logging.info(f"CreateBar called for {bar_name} on {output or 'any output'}")
+        return self.on_create_bar(bar_name, output)
+
+    @method()
+    def DestroyBar(self, instance_name: "s"):
+        logging.info(f"DestroyBar called for {instance_name}")
+        self.on_destroy_bar(instance_name)
+
+    @method()
+    def ListBars(self) -> "as":
+        return self.on_list_bars()
@@ -114,6 +114,18 @@ module = {
         "show_label": boolean(default=False),
         "label": string(default="Label"),
         "length": integer(default=25),
+        "show_window_count": boolean(
+            default=False,
+            description="Show the number of windows on each workspace (sway modules only)",
+        ),
+        "min_refresh_interval_ms": integer(
+            default=250,
+            description="Minimum time between refreshes of a tray item's icon or title (tray modules only)",
+        ),
+        "menu_idle_timeout_seconds": integer(
+            default=60,
+            description="Time after closing a tray item's menu before it is released (tray modules only)",
+        ),
     },
     "required": ["type"],
 }
@@ -1,56 +1,210 @@
 import asyncio
+import importlib
 import logging
 import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple
 import gi
-from python_reactive_ui import Component
-from python_reactive_ui.backends.gtk3.root import create_root
-from ustatus.components.module import ReactiveModule
-from ustatus.components.modules.battery import Battery
-from ustatus.components.modules.clock import Clock
-from ustatus.components.modules.test import Test
-from ustatus.components.modules.volume import Volume
-
-from ustatus.config import BarConfig, Config, ConfigError
-from ustatus.module import Module
-from ustatus.modules.cpu_module import CpuModule
-from ustatus.modules.mpris_module import MprisModule
-from ustatus.modules.power_module import PowerModule
-from ustatus.modules.power_profiles_module import PowerProfilesModule
-from ustatus.modules.sway_module import SwayModule
-from ustatus.modules.tray_module import TrayModule
-from ustatus.modules.volume_module import VolumeModule
-from ustatus.remote_service import init_service
-from ustatus.utils.swaymsg import get_outputs
 
 gi.require_version("Gtk", "3.0")
-gi.require_version("DbusmenuGtk3", "0.4")
 gi.require_version("GtkLayerShell", "0.1")
 
-from gi.repository import Gtk, GtkLayerShell, Gdk, Notify
+from ustatus.config import (
+    BarConfig,
+    Config,
+    ConfigError,
+    ModuleConfig,
+    get_config_paths,
+)
+from ustatus.module import Module
+from ustatus.remote_service import init_daemon_service, init_service, remove_service
+from ustatus.utils.config_watcher import ConfigWatcher
+from ustatus.utils.notifications import init_notifications, notify_error
+from ustatus.utils.outputs import get_output_registry
+from ustatus.utils.profiler import get_startup_profiler
+
+from gi.repository import Gtk, GtkLayerShell, Gdk
+
+# Module types by name, as (module path, class name). A module type, and the
+# libraries and GI typelibs it needs, is only imported once a bar uses it
+MODULE_TYPES: Dict[str, Tuple[str, str]] = {
+    "volume": ("ustatus.components.modules.volume", "Volume"),
+    "battery": ("ustatus.components.modules.battery", "Battery"),
+    "mpris": ("ustatus.modules.mpris_module", "MprisModule"),
+    "cpu": ("ustatus.modules.cpu_module", "CpuModule"),
+    "tray": ("ustatus.modules.tray_module", "TrayModule"),
+    "sway": ("ustatus.modules.sway_module", "SwayModule"),
+    "power_profiles": (
+        "ustatus.modules.power_profiles_module",
+        "PowerProfilesModule",
+    ),
+    "power": ("ustatus.modules.power_module", "PowerModule"),
+    "test": ("ustatus.components.modules.test", "Test"),
+    "clock": ("ustatus.components.modules.clock", "Clock"),
+}
+
+
+def get_module_type(type_name: str):
+    if type_name not in MODULE_TYPES:
+        raise ConfigError(f"Module type {type_name} not defined.")
+    module_path, class_name = MODULE_TYPES[type_name]
+    if module_path in sys.modules:
+        return getattr(sys.modules[module_path], class_name)
+    with get_startup_profiler().phase(f"import {type_name}"):
+        return getattr(importlib.import_module(module_path), class_name)
 
 
 class Ustatus(Gtk.Application):
     def do_activate(self):
-        self.config: Config = Config()
-        bar_name = self.config.bar_name
-        output = self.config.config_dict["bars"][bar_name].get("output", None)
-        Notify.init(f"ustatus {bar_name}")
+        profiler = get_startup_profiler()
+        with profiler.phase("config"):
+            self.config: Config = Config()
+        profiler.configure(
+            self.config.profile_startup, self.config.startup_budgets, self.quit
+        )
+        self.bars: Dict[str, Bar] = dict()
+        if self.config.daemon:
+            init_notifications("ustatus")
+        else:
+            init_notifications(f"ustatus {self.config.bar_name}")
+
+        with profiler.phase("css"):
+            self._load_css()
+        for bar_name in self.config.bar_names:
+            with profiler.phase(f"bar {bar_name}"):
+                self.create_bar(bar_name)
+        self.config_watcher = ConfigWatcher(get_config_paths(), self.reload_config)
+
+        if self.config.daemon:
+            # Keep running while there are no bars
+            self.hold()
+            asyncio.create_task(
+                init_daemon_service(
+                    self.create_bar, self.destroy_bar, lambda: list(self.bars)
+                )
+            )
 
-        # Create the windows and link them to current application
-        self._create_windows()
+    def create_bar(self, bar_name: str, output: str = "") -> str:
+        """Create a bar from the configuration of bar_name, or an instance of it
+        bound to output, and return the name it is known by."""
+        if bar_name not in self.config.bars:
+            raise ConfigError(f"Bar {bar_name} not defined.")
+        if output:
+            instance_name = f"{bar_name}_{re.sub('[^A-Za-z0-9_]', '_', output)}"
+        else:
+            instance_name = bar_name
+        if instance_name in self.bars:
+            return instance_name
+        if output:
+            bar_config = self.config.add_bar_instance(bar_name, instance_name, output)
+        else:
+            bar_config = self.config.get_bar_config(bar_name)
+        self.bars[instance_name] = Bar(self, self.config, instance_name, bar_config)
+        return instance_name
+
+    def destroy_bar(self, instance_name: str):
+        bar = self.bars.pop(instance_name, None)
+        if bar is None:
+            raise Exception(f"Bar {instance_name} does not exist")
+        bar.destroy()
+        if instance_name not in self.config.bar_names:
+            self.config.remove_bar_instance(instance_name)
+        logging.info(f"Destroyed bar {instance_name}")
+
+    def reload_config(self):
+        """Apply changes to the config files to the running bars, rebuilding
+        only what changed."""
+        try:
+            if not self.config.reload():
+                return
+        except ConfigError as e:
+            logging.error(f"Keeping the current config: {e}")
+            notify_error(summary="Invalid config", body=str(e))
+            return
+        logging.info("Config changed, updating bars")
+        for instance_name, bar in list(self.bars.items()):
+            bar_config = self.config.bars.get(instance_name)
+            if bar_config is None:
+                logging.warning(f"Bar {instance_name} is no longer defined")
+                continue
+            try:
+                if bar.can_reconfigure(bar_config):
+                    bar.reconfigure(bar_config)
+                else:
+                    # Built before the old bar goes, which is kept if this fails
+                    new_bar = Bar(self, self.config, instance_name, bar_config)
+                    bar.destroy(release_service=False)
+                    self.bars[instance_name] = new_bar
+            except Exception as e:
+                logging.error(f"Failed to update bar {instance_name}: {e}")
+                notify_error(summary="Invalid config", body=str(e))
+
+    def _load_css(self):
+        self._load_custom_css()
+        screen = Gdk.Screen.get_default()
+        provider = Gtk.CssProvider()
+        style_context = Gtk.StyleContext()
+        style_context.add_provider_for_screen(
+            screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
+        )
+        css = """
+    .module-button {padding: 0; border: none;}
+    """
+        provider.load_from_data(css.encode())
 
-        self.bar_config: BarConfig = self.config.get_bar_config(bar_name)
+    def _load_custom_css(self):
+        if "XDG_CONFIG_HOME" in os.environ:
+            config_path = os.path.expandvars("$XDG_CONFIG_HOME/ustatus/ustatus.css")
+        else:
+            config_path = os.path.expandvars("$HOME/.config/ustatus/ustatus.css")
+        if os.path.exists(config_path):
+            logging.info(f"Loading CSS from {config_path}")
+            screen = Gdk.Screen.get_default()
+            provider = Gtk.CssProvider()
+            style_context = Gtk.StyleContext()
+            style_context.add_provider_for_screen(
+                screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_USER
+            )
+            provider.load_from_path(config_path)
+
+
+class Bar:
+    """A bar window with its modal window and modules."""
+
+    def __init__(
+        self,
+        application: Gtk.Application,
+        config: Config,
+        bar_name: str,
+        bar_config: BarConfig,
+    ):
+        self.application = application
+        self.config = config
+        self.bar_config = bar_config
         self.modal_widget = None
         self.bar_name = bar_name
-        self.output = output
+        self.output = bar_config.output
+        self.is_shown = True
 
-        self._setup_gtk_theme()
-        self._setup_css_classes()
-        self._load_css()
+        # Create the windows and link them to current application
+        self._create_windows()
 
-        self._init_box()
-        self._init_layer_shell()
-        self._init_modules()
+        try:
+            self._setup_gtk_theme()
+            self._setup_css_classes()
+
+            self._init_box()
+            self._init_layer_shell()
+            with get_startup_profiler().phase(f"modules {bar_name}"):
+                self._init_modules()
+        except Exception:
+            # Modules that were not packed yet are not destroyed with the window
+            for _, module in getattr(self, "module_instances", []):
+                module.destroy()
+            self.modal_window.destroy()
+            self.window.destroy()
+            raise
 
         self.center_box.show_all()
         self.box.show_all()
@@ -69,11 +223,22 @@ class Ustatus(Gtk.Application):
 
         logging.info(f"Initialized bar {bar_name}")
 
+    def destroy(self, release_service: bool = True):
+        """Destroy the bar's windows and modules. release_service is False when
+        a new bar of the same name takes over its remote service."""
+        if release_service:
+            asyncio.create_task(remove_service(self.bar_name))
+        if self.output:
+            get_output_registry().remove_listener(self.output, self._on_monitor_changed)
+        self.hide_modal()
+        self.modal_window.destroy()
+        self.window.destroy()
+
     def _create_windows(self):
         self.window = Gtk.Window.new(Gtk.WindowType.TOPLEVEL)
-        self.window.set_application(self)
+        self.window.set_application(self.application)
         self.modal_window = Gtk.Window.new(Gtk.WindowType.TOPLEVEL)
-        self.modal_window.set_application(self)
+        self.modal_window.set_application(self.application)
 
     def _setup_gtk_theme(self):
         if self.bar_config.theme_override is not None:
@@ -95,22 +260,25 @@ class Ustatus(Gtk.Application):
         modal_style_context.add_class("modal")
 
     async def _move_to_monitor(self):
-        monitor = await self._get_gdk_monitor(self.output)
-        GtkLayerShell.set_monitor(self, monitor)
-
-    async def _get_gdk_monitor(self, output):
-        outputs = await get_outputs()
-        out = list(filter(lambda m: m["name"] == output, outputs))
-        assert len(out) == 1
-        out = out[0]
-
-        display = self.get_display()
-        for num in range(display.get_n_monitors()):
-            m = display.get_monitor(num)
-            if m.get_model() == out["model"]:
-                return m
+        registry = get_output_registry()
+        registry.add_listener(self.output, self._on_monitor_changed)
+        await registry.start()
+        monitor = registry.get_monitor(self.output)
+        if monitor is None:
+            logging.warning(f"Could not find monitor for output {self.output}")
+        else:
+            GtkLayerShell.set_monitor(self.window, monitor)
 
-        raise Exception(f"Could not find monitor {out}")
+    def _on_monitor_changed(self, monitor):
+        if monitor is None:
+            logging.info(f"Output {self.output} disconnected")
+            self.hide_modal()
+            self.window.hide()
+        else:
+            logging.info(f"Output {self.output} connected")
+            GtkLayerShell.set_monitor(self.window, monitor)
+            if self.is_shown:
+                self.window.show()
 
     def _init_layer_shell(self):
         GtkLayerShell.init_for_window(self.window)
@@ -138,12 +306,83 @@ class Ustatus(Gtk.Application):
             )
 
     def _init_modules(self):
+        self.module_instances: List[Tuple[ModuleConfig, Gtk.Widget]] = []
         self.modules_start = self.instantiate_modules(self.bar_config.modules_start)
         self.modules_center = self.instantiate_modules(self.bar_config.modules_center)
         self.modules_end = self.instantiate_modules(
             reversed(self.bar_config.modules_end)
         )
+        self._pack_modules()
+
+    def can_reconfigure(self, bar_config: BarConfig) -> bool:
+        """Whether bar_config can be applied in place, which is when only the
+        modules differ."""
+        no_modules = dict(modules_start=(), modules_center=(), modules_end=())
+        return self.bar_config.replace(**no_modules) == bar_config.replace(**no_modules)
+
+    def reconfigure(self, bar_config: BarConfig):
+        """Apply a bar_config that only differs in its modules.
+
+        Module instances whose configuration did not change are moved to their
+        new place, along with their live data sources; the others are created
+        or destroyed. Nothing changes if a module cannot be created.
+        """
+        if self.bar_config == bar_config and all(
+            self.config.get_module_config(module_config.module_name) == module_config
+            for module_config, _ in self.module_instances
+        ):
+            return
+        old_bar_config = self.bar_config
+        old_instances = self.module_instances
+        old_modules = self.modules_start + self.modules_center + self.modules_end
+        reusable: Dict[ModuleConfig, List[Gtk.Widget]] = dict()
+        for module_config, module in old_instances:
+            reusable.setdefault(module_config, []).append(module)
+
+        self.bar_config = bar_config
+        self.module_instances = []
+        try:
+            modules_start = self.instantiate_modules(bar_config.modules_start, reusable)
+            modules_center = self.instantiate_modules(
+                bar_config.modules_center, reusable
+            )
+            modules_end = self.instantiate_modules(
+                reversed(bar_config.modules_end), reusable
+            )
+        except Exception:
+            kept = set(module for _, module in old_instances)
+            for _, module in self.module_instances:
+                if module not in kept:
+                    module.destroy()
+            self.bar_config = old_bar_config
+            self.module_instances = old_instances
+            raise
+
+        self._unpack_modules()
+        self.modules_start = modules_start
+        self.modules_center = modules_center
+        self.modules_end = modules_end
+        self._pack_modules()
+
+        in_use = set(module for _, module in self.module_instances)
+        unused = [module for module in old_modules if module not in in_use]
+        if unused:
+            # The modal may be showing a widget of a destroyed module
+            self.hide_modal()
+        for module in unused:
+            module.destroy()
+        self.center_box.show_all()
+        self.box.show_all()
+        created = len(in_use - set(old_modules))
+        logging.info(f"Reconfigured bar {self.bar_name}, created {created} modules")
+
+    def _unpack_modules(self):
+        for module in self.modules_start + self.modules_end:
+            self.box.remove(module)
+        for module in self.modules_center:
+            self.center_box.remove(module)
 
+    def _pack_modules(self):
         for module in self.modules_start:
             self.box.pack_start(child=module, expand=False, fill=False, padding=0)
         for module in self.modules_center:
@@ -154,9 +393,11 @@ class Ustatus(Gtk.Application):
             self.box.pack_end(child=module, expand=False, fill=False, padding=0)
 
     def show_status(self):
+        self.is_shown = True
         self.window.show()
 
     def hide_status(self):
+        self.is_shown = False
         self.hide_modal()
         self.window.hide()
 
@@ -220,20 +461,33 @@ class Ustatus(Gtk.Application):
                 raise ConfigError(f"Orientation {other} not defined.")
         self.scrolled_window_container.add(self.box)
 
-    def instantiate_modules(self, module_names):
+    def instantiate_modules(
+        self,
+        module_names,
+        reusable: Optional[Dict[ModuleConfig, List[Gtk.Widget]]] = None,
+    ):
+        """Create the modules of the given names, taking instances with the
+        same configuration from reusable when possible."""
+        profiler = get_startup_profiler()
         modules = []
         for module_name in module_names:
             module_config = self.config.get_module_config(module_name)
-            modules.append(
-                self._create_builtin_module(
-                    module_config=module_config,
-                    bar_config=self.bar_config,
-                    gtk_orientation=self.gtk_orientation,
-                    toggle_modal=self.toggle_modal,
-                    output=self.output,
-                    bar_width=self.bar_config.width,
-                )
-            )
+            if reusable and reusable.get(module_config):
+                module = reusable[module_config].pop(0)
+            else:
+                name = f"{self.bar_name}/{module_name}"
+                with profiler.phase(f"module {name}"):
+                    module = self._create_builtin_module(
+                        module_config=module_config,
+                        bar_config=self.bar_config,
+                        gtk_orientation=self.gtk_orientation,
+                        toggle_modal=self.toggle_modal,
+                        output=self.output,
+                        bar_width=self.bar_config.width,
+                    )
+                profiler.expect_draw(module, name)
+            self.module_instances.append((module_config, module))
+            modules.append(module)
             if self.bar_config.separators:
                 modules.append(Gtk.Separator.new(orientation=self._not_orientation()))
         return modules
@@ -300,56 +554,21 @@ class Ustatus(Gtk.Application):
             case other:
                 raise Exception(f"Orientation {other} not recognized")
 
-    def _load_css(self):
-        self._load_custom_css()
-        screen = Gdk.Screen.get_default()
-        provider = Gtk.CssProvider()
-        style_context = Gtk.StyleContext()
-        style_context.add_provider_for_screen(
-            screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION
-        )
-        css = """
-    .module-button {padding: 0; border: none;}
-    """
-        provider.load_from_data(css.encode())
-
-    def _load_custom_css(self):
-        if "XDG_CONFIG_HOME" in os.environ:
-            config_path = os.path.expandvars("$XDG_CONFIG_HOME/ustatus/ustatus.css")
-        else:
-            config_path = os.path.expandvars("$HOME/.config/ustatus/ustatus.css")
-        if os.path.exists(config_path):
-            logging.info(f"Loading CSS from {config_path}")
-            screen = Gdk.Screen.get_default()
-            provider = Gtk.CssProvider()
-            style_context = Gtk.StyleContext()
-            style_context.add_provider_for_screen(
-                screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_USER
-            )
-            provider.load_from_path(config_path)
-
     def _create_builtin_module(self, **kwargs):
-        builtins = {
-            "volume": Volume,
-            "battery": Battery,
-            "mpris": MprisModule,
-            "cpu": CpuModule,
-            "tray": TrayModule,
-            "sway": SwayModule,
-            "power_profiles": PowerProfilesModule,
-            "power": PowerModule,
-            "test": Test,
-            "clock": Clock,
-        }
         module_config = kwargs["module_config"]
-        if module_config.type in builtins:
-            module_type = builtins[module_config.type]
-            if issubclass(module_type, Module):
-                return builtins[module_config.type](**kwargs)
-            elif issubclass(module_type, Component):
-                box = Gtk.Box()
-                root = create_root(box)
-                root.render(ReactiveModule(kwargs, [module_type(kwargs)]))
-                return box
-        else:
-            raise ConfigError(f"Module type {module_config.type} not defined.")
+        module_type = get_module_type(module_config.type)
+        if issubclass(module_type, Module):
+            return module_type(**kwargs)
+        from python_reactive_ui import Component
+        from python_reactive_ui.backends.gtk3.root import create_root
+        from ustatus.components.module import ModuleLifetime, ReactiveModule
+
+        if issubclass(module_type, Component):
+            box = Gtk.Box()
+            lifetime = ModuleLifetime()
+            box.connect("destroy", lambda _: lifetime.close())
+            props = dict(kwargs, lifetime=lifetime)
+            root = create_root(box)
+            root.render(ReactiveModule(props, [module_type(props)]))
+            return box
+        raise ConfigError(f"Module type {module_config.type} is not a module.")
@@ -0,0 +1,121 @@
+import asyncio
+import base64
+import hashlib
+import logging
+import os
+import os.path
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+from gi.repository import GdkPixbuf, GLib
+
+from ustatus.config import get_user_cache_dir
+from ustatus.utils.cache_dir import prune_cache_dir
+from ustatus.utils.lru import LruCache
+
+ART_MEMORY_CACHE_BYTES = 16 * 1024 * 1024
+ART_DISK_CACHE_ENTRIES = 256
+
+_memory_cache = LruCache(
+    ART_MEMORY_CACHE_BYTES, size_of=lambda pixbuf: pixbuf.get_byte_length()
+)
+_in_flight: Dict[str, asyncio.Future] = dict()
+
+
+async def get_art(url: str, size: int) -> Optional[GdkPixbuf.Pixbuf]:
+    """Load the album art at an mpris:artUrl as a thumbnail of at most size
+    pixels, for file:// and data: URLs.
+
+    Thumbnails are kept in memory and on disk, keyed by the URL, the file's
+    mtime and the size. The file is stat'ed, decoded and scaled in a worker
+    thread, and the disk cache keeps the ART_DISK_CACHE_ENTRIES most recently
+    used thumbnails.
+    """
+    loop = asyncio.get_running_loop()
+    if urlparse(url).scheme == "file":
+        key = await loop.run_in_executor(None, _cache_key, url, size)
+    else:
+        key = _cache_key(url, size)
+    if key is None:
+        return None
+    pixbuf = _memory_cache.get(key)
+    if pixbuf is not None:
+        return pixbuf
+    if key not in _in_flight:
+        _in_flight[key] = loop.run_in_executor(None, _load, url, size, key)
+    try:
+        pixbuf = await asyncio.shield(_in_flight[key])
+    finally:
+        _in_flight.pop(key, None)
+    if pixbuf is not None:
+        _memory_cache.put(key, pixbuf)
+    return pixbuf
+
+
+def _cache_key(url: str, size: int) -> Optional[str]:
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        try:
+            mtime = os.stat(unquote(parsed.path)).st_mtime_ns
+        except OSError:
+            return None
+        identity = f"{url}\0{mtime}\0{size}"
+    elif parsed.scheme == "data":
+        identity = f"{url}\0{size}"
+    else:
+        return None
+    return hashlib.sha1(identity.encode()).hexdigest()
+
+
+def _get_disk_path(key: str) -> str:
+    return os.path.join(get_user_cache_dir(), "art", f"{key}.png")
+
+
+def _load(url: str, size: int, key: str) -> Optional[GdkPixbuf.Pixbuf]:
+    disk_path = _get_disk_path(key)
+    try:
+        pixbuf = GdkPixbuf.Pixbuf.new_from_file(disk_path)
+        # Mark it as recently used, for pruning
+        os.utime(disk_path)
+        return pixbuf
+    except (GLib.Error, OSError):
+        pass
+    try:
+        pixbuf = _decode(url, size)
+    except (GLib.Error, ValueError) as e:
+        logging.warning(f"Failed to load album art {url[:100]}: {e}")
+        return None
+    try:
+        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+        pixbuf.savev(disk_path, "png", [], [])
+        prune_cache_dir(os.path.dirname(disk_path), ".png", ART_DISK_CACHE_ENTRIES)
+    except (GLib.Error, OSError) as e:
+        logging.warning(f"Failed to cache album art: {e}")
+    return pixbuf
+
+
+def _decode(url: str, size: int) -> GdkPixbuf.Pixbuf:
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        # The loader scales while decoding, so the full-size image is never
+        # held in memory
+        return GdkPixbuf.Pixbuf.new_from_file_at_scale(
+            unquote(parsed.path), size, size, True
+        )
+    header, _, data = url.partition(",")
+    if header.endswith(";base64"):
+        raw = base64.b64decode(data)
+    else:
+        raw = unquote(data).encode("latin-1")
+    loader = GdkPixbuf.PixbufLoader()
+    loader.connect("size-prepared", _fit_size, size)
+    loader.write(raw)
+    loader.close()
+    pixbuf = loader.get_pixbuf()
+    if pixbuf is None:
+        raise ValueError("not an image")
+    return pixbuf
+
+
+def _fit_size(loader: GdkPixbuf.PixbufLoader, width: int, height: int, size: int):
+    scale = min(1.0, size / max(width, height, 1))
+    loader.set_size(max(1, round(width * scale)), max(1, round(height * scale)))
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from dbus_next.aio.message_bus import MessageBus
+from dbus_next.constants import BusType, MessageType
+from dbus_next.message import Message
+
+from ustatus.utils.profiler import get_startup_profiler
+
+
+class SignalHandler:
+    def __init__(
+        self,
+        manager: "BusManager",
+        interface: str,
+        member: str,
+        callback: Callable[[Message], None],
+        sender: Optional[str],
+        path: Optional[str],
+    ):
+        self.manager = manager
+        self.interface = interface
+        self.member = member
+        self.callback = callback
+        self.sender = sender
+        self.path = path
+
+    def match_rule(self) -> str:
+        rule = f"type='signal',interface='{self.interface}',member='{self.member}'"
+        if self.sender is not None:
+            rule += f",sender='{self.sender}'"
+        if self.path is not None:
+            rule += f",path='{self.path}'"
+        return rule
+
+    def matches(self, msg: Message) -> bool:
+        # Signals carry the unique name of their sender, so well-known sender
+        # names are compared through the owner the manager tracks for them
+        if self.sender is not None and msg.sender != self.sender:
+            if msg.sender != self.manager.get_owner(self.sender):
+                return False
+        return self.path is None or msg.path == self.path
+
+    def remove(self):
+        self.manager.remove_signal_handler(self)
+
+
+class BusManager:
+    """Hands out a single shared connection to a message bus.
+
+    Signal handlers registered through add_signal_handler share one AddMatch
+    per distinct rule, reference-counted and removed with the last handler,
+    and are dispatched from one message handler indexed by interface and
+    member instead of one handler per proxy. The unique owner of well-known
+    sender names is looked up and followed through NameOwnerChanged, so that
+    handlers only see signals from the sender they asked for.
+    """
+
+    def __init__(self, bus_type: BusType):
+        self.bus_type = bus_type
+        self._connect_task: Optional[asyncio.Task] = None
+        self._handlers: Dict[Tuple[str, str], List[SignalHandler]] = dict()
+        self._match_refs: Dict[str, int] = dict()
+        self._owners: Dict[str, Optional[str]] = dict()
+        self._owner_refs: Dict[str, int] = dict()
+
+    async def get_bus(self) -> MessageBus:
+        if self._connect_task is None:
+            self._connect_task = asyncio.create_task(self._connect())
+            self._connect_task.add_done_callback(self._on_connect_done)
+        return await asyncio.shield(self._connect_task)
+
+    def _on_connect_done(self, task: asyncio.Task):
+        # A failed connection is retried by the next get_bus
+        if task.cancelled() or task.exception() is not None:
+            if self._connect_task is task:
+                self._connect_task = None
+
+    async def add_signal_handler(
+        self,
+        interface: str,
+        member: str,
+        callback: Callable[[Message], None],
+        sender: Optional[str] = None,
+        path: Optional[str] = None,
+    ) -> SignalHandler:
+        bus = await self.get_bus()
+        handler = SignalHandler(self, interface, member, callback, sender, path)
+        if _is_well_known(sender):
+            await self._track_owner(bus, sender)
+        self._handlers.setdefault((interface, member), []).append(handler)
+        await self._add_match(bus, handler.match_rule())
+        return handler
+
+    def remove_signal_handler(self, handler: SignalHandler):
+        handlers = self._handlers.get((handler.interface, handler.member), [])
+        if handler not in handlers:
+            return
+        handlers.remove(handler)
+        self._remove_match(handler.match_rule())
+        if _is_well_known(handler.sender):
+            self._untrack_owner(handler.sender)
+
+    def get_owner(self, name: str) -> Optional[str]:
+        return self._owners.get(name)
+
+    async def _track_owner(self, bus: MessageBus, name: str):
+        self._owner_refs[name] = self._owner_refs.get(name, 0) + 1
+        if self._owner_refs[name] > 1:
+            return
+        self._owners[name] = None
+        await self._add_match(bus, _owner_changed_rule(name))
+        reply = await bus.call(
+            Message(
+                destination="org.freedesktop.DBus",
+                path="/org/freedesktop/DBus",
+                interface="org.freedesktop.DBus",
+                member="GetNameOwner",
+                signature="s",
+                body=[name],
+            )
+        )
+        # An error reply means the name has no owner yet
+        if reply.message_type == MessageType.METHOD_RETURN and name in self._owners:
+            self._owners[name] = reply.body[0]
+
+    def _untrack_owner(self, name: str):
+        self._owner_refs[name] -= 1
+        if self._owner_refs[name] == 0:
+            del self._owner_refs[name]
+            del self._owners[name]
+            self._remove_match(_owner_changed_rule(name))
+
+    async def _add_match(self, bus: MessageBus, rule: str):
+        self._match_refs[rule] = self._match_refs.get(rule, 0) + 1
+        if self._match_refs[rule] == 1:
+            await bus.call(_match_message("AddMatch", rule))
+
+    def _remove_match(self, rule: str):
+        self._match_refs[rule] -= 1
+        if self._match_refs[rule] == 0:
+            del self._match_refs[rule]
+            assert self._connect_task is not None
+            bus = self._connect_task.result()
+            if bus.connected:
+                asyncio.create_task(bus.call(_match_message("RemoveMatch", rule)))
+
+    async def _connect(self) -> MessageBus:
+        name = self.bus_type.name.lower()
+        with get_startup_profiler().phase(f"{name} bus connect"):
+            bus = await MessageBus(bus_type=self.bus_type).connect()
+        bus.add_message_handler(self._on_message)
+        logging.info(f"Connected to {name} bus")
+        return bus
+
+    def _on_message(self, msg: Message):
+        if msg.message_type != MessageType.SIGNAL:
+            return
+        if (
+            msg.member == "NameOwnerChanged"
+            and msg.sender == "org.freedesktop.DBus"
+            and msg.body[0] in self._owners
+        ):
+            self._owners[msg.body[0]] = msg.body[2] or None
+        handlers = self._handlers.get((msg.interface, msg.member))
+        if handlers:
+            for handler in list(handlers):
+                if handler.matches(msg):
+                    try:
+                        handler.callback(msg)
+                    except Exception:
+                        logging.exception(
+                            f"{msg.interface}.{msg.member} signal handler failed"
+                        )
+
+
+def _is_well_known(name: Optional[str]) -> bool:
+    # The bus daemon sends its own signals under its well-known name
+    return (
+        name is not None and not name.startswith(":") and name != "org.freedesktop.DBus"
+    )
+
+
+def _owner_changed_rule(name: str) -> str:
+    return (
+        "type='signal',sender='org.freedesktop.DBus',"
+        "interface='org.freedesktop.DBus',member='NameOwnerChanged',"
+        f"arg0='{name}'"
+    )
+
+
+def _match_message(member: str, rule: str) -> Message:
+    return Message(
+        destination="org.freedesktop.DBus",
+        path="/org/freedesktop/DBus",
+        interface="org.freedesktop.DBus",
+        member=member,
+        signature="s",
+        body=[rule],
+    )
+
+
+_managers: Dict[BusType, BusManager] = dict()
+
+
+def get_bus_manager(bus_type: BusType = BusType.SESSION) -> BusManager:
+    if bus_type not in _managers:
+        _managers[bus_type] = BusManager(bus_type)
+    return _managers[bus_type]
+
+
+async def get_session_bus() -> MessageBus:
+    return await get_bus_manager(BusType.SESSION).get_bus()
+
+
+async def get_system_bus() -> MessageBus:
+    return await get_bus_manager(BusType.SYSTEM).get_bus()
@@ -0,0 +1,27 @@
+import os
+from typing import List, Tuple
+
+
+def prune_cache_dir(cache_dir: str, suffix: str, max_entries: int):
+    """Keep only the max_entries most recently modified files in cache_dir
+    whose names end with suffix.
+
+    Files that another process removes while pruning are skipped.
+    """
+    entries: List[Tuple[float, str]] = []
+    for entry in os.scandir(cache_dir):
+        if not entry.name.endswith(suffix):
+            continue
+        try:
+            if entry.is_file():
+                entries.append((entry.stat().st_mtime, entry.path))
+        except FileNotFoundError:
+            pass
+    if len(entries) <= max_entries:
+        return
+    entries.sort(reverse=True)
+    for _, path in entries[max_entries:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,50 @@
+from typing import Callable, List, Optional
+from gi.repository import Gio, GLib
+
+CONFIG_RELOAD_DELAY_MS = 200
+
+IGNORED_EVENTS = (
+    Gio.FileMonitorEvent.ATTRIBUTE_CHANGED,
+    Gio.FileMonitorEvent.PRE_UNMOUNT,
+    Gio.FileMonitorEvent.UNMOUNTED,
+)
+
+
+class ConfigWatcher:
+    """Calls on_change once the watched config files settle after a change.
+
+    Files are watched through Gio, which uses inotify on Linux, and do not
+    need to exist yet. Editors often save with several writes, or by replacing
+    the file, so events are debounced into a single call.
+    """
+
+    def __init__(self, paths: List[str], on_change: Callable[[], None]):
+        self.on_change = on_change
+        self.timeout_id: Optional[int] = None
+        self.monitors: List[Gio.FileMonitor] = []
+        for path in paths:
+            monitor = Gio.File.new_for_path(path).monitor_file(
+                Gio.FileMonitorFlags.NONE, None
+            )
+            monitor.connect("changed", self._on_changed)
+            self.monitors.append(monitor)
+
+    def stop(self):
+        for monitor in self.monitors:
+            monitor.cancel()
+        self.monitors = []
+        if self.timeout_id is not None:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+
+    def _on_changed(self, monitor, file, other_file, event_type):
+        if event_type in IGNORED_EVENTS:
+            return
+        if self.timeout_id is not None:
+            GLib.source_remove(self.timeout_id)
+        self.timeout_id = GLib.timeout_add(CONFIG_RELOAD_DELAY_MS, self._on_timeout)
+
+    def _on_timeout(self):
+        self.timeout_id = None
+        self.on_change()
+        return False
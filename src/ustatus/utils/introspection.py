@@ -0,0 +1,252 @@
+from typing import Dict, Iterable, Optional
+from dbus_next import introspection as intr
+from dbus_next.aio.message_bus import MessageBus
+from dbus_next.aio.proxy_object import ProxyObject
+from dbus_next.constants import MessageType
+from dbus_next.message import Message
+
+from ustatus.utils.lru import LruCache
+
+INTROSPECTION_CACHE_SIZE = 64
+
+# Introspection data of well-known interfaces, which never changes, so proxies
+# for them can be built without an Introspect round trip
+KNOWN_INTERFACES: Dict[str, str] = {
+    "org.freedesktop.DBus": """
+<interface name="org.freedesktop.DBus">
+  <method name="Hello"><arg direction="out" type="s"/></method>
+  <method name="RequestName">
+    <arg direction="in" type="s"/><arg direction="in" type="u"/>
+    <arg direction="out" type="u"/>
+  </method>
+  <method name="ReleaseName">
+    <arg direction="in" type="s"/><arg direction="out" type="u"/>
+  </method>
+  <method name="StartServiceByName">
+    <arg direction="in" type="s"/><arg direction="in" type="u"/>
+    <arg direction="out" type="u"/>
+  </method>
+  <method name="NameHasOwner">
+    <arg direction="in" type="s"/><arg direction="out" type="b"/>
+  </method>
+  <method name="ListNames"><arg direction="out" type="as"/></method>
+  <method name="ListActivatableNames"><arg direction="out" type="as"/></method>
+  <method name="AddMatch"><arg direction="in" type="s"/></method>
+  <method name="RemoveMatch"><arg direction="in" type="s"/></method>
+  <method name="GetNameOwner">
+    <arg direction="in" type="s"/><arg direction="out" type="s"/>
+  </method>
+  <signal name="NameOwnerChanged">
+    <arg type="s"/><arg type="s"/><arg type="s"/>
+  </signal>
+  <signal name="NameLost"><arg type="s"/></signal>
+  <signal name="NameAcquired"><arg type="s"/></signal>
+</interface>
+""",
+    "org.freedesktop.DBus.Properties": """
+<interface name="org.freedesktop.DBus.Properties">
+  <method name="Get">
+    <arg name="interface_name" direction="in" type="s"/>
+    <arg name="property_name" direction="in" type="s"/>
+    <arg name="value" direction="out" type="v"/>
+  </method>
+  <method name="GetAll">
+    <arg name="interface_name" direction="in" type="s"/>
+    <arg name="properties" direction="out" type="a{sv}"/>
+  </method>
+  <method name="Set">
+    <arg name="interface_name" direction="in" type="s"/>
+    <arg name="property_name" direction="in" type="s"/>
+    <arg name="value" direction="in" type="v"/>
+  </method>
+  <signal name="PropertiesChanged">
+    <arg name="interface_name" type="s"/>
+    <arg name="changed_properties" type="a{sv}"/>
+    <arg name="invalidated_properties" type="as"/>
+  </signal>
+</interface>
+""",
+    "org.kde.StatusNotifierWatcher": """
+<interface name="org.kde.StatusNotifierWatcher">
+  <method name="RegisterStatusNotifierItem">
+    <arg name="service" direction="in" type="s"/>
+  </method>
+  <method name="RegisterStatusNotifierHost">
+    <arg name="service" direction="in" type="s"/>
+  </method>
+  <property name="RegisteredStatusNotifierItems" type="as" access="read"/>
+  <property name="IsStatusNotifierHostRegistered" type="b" access="read"/>
+  <property name="ProtocolVersion" type="i" access="read"/>
+  <signal name="StatusNotifierItemRegistered"><arg type="s"/></signal>
+  <signal name="StatusNotifierItemUnregistered"><arg type="s"/></signal>
+  <signal name="StatusNotifierHostRegistered"/>
+</interface>
+""",
+    "org.kde.StatusNotifierItem": """
+<interface name="org.kde.StatusNotifierItem">
+  <property name="Category" type="s" access="read"/>
+  <property name="Id" type="s" access="read"/>
+  <property name="Title" type="s" access="read"/>
+  <property name="Status" type="s" access="read"/>
+  <property name="WindowId" type="i" access="read"/>
+  <property name="IconThemePath" type="s" access="read"/>
+  <property name="Menu" type="o" access="read"/>
+  <property name="ItemIsMenu" type="b" access="read"/>
+  <property name="IconName" type="s" access="read"/>
+  <property name="IconPixmap" type="a(iiay)" access="read"/>
+  <property name="OverlayIconName" type="s" access="read"/>
+  <property name="OverlayIconPixmap" type="a(iiay)" access="read"/>
+  <property name="AttentionIconName" type="s" access="read"/>
+  <property name="AttentionIconPixmap" type="a(iiay)" access="read"/>
+  <property name="AttentionMovieName" type="s" access="read"/>
+  <property name="ToolTip" type="(sa(iiay)ss)" access="read"/>
+  <method name="ContextMenu">
+    <arg name="x" direction="in" type="i"/><arg name="y" direction="in" type="i"/>
+  </method>
+  <method name="Activate">
+    <arg name="x" direction="in" type="i"/><arg name="y" direction="in" type="i"/>
+  </method>
+  <method name="SecondaryActivate">
+    <arg name="x" direction="in" type="i"/><arg name="y" direction="in" type="i"/>
+  </method>
+  <method name="Scroll">
+    <arg name="delta" direction="in" type="i"/>
+    <arg name="orientation" direction="in" type="s"/>
+  </method>
+  <signal name="NewTitle"/>
+  <signal name="NewIcon"/>
+  <signal name="NewAttentionIcon"/>
+  <signal name="NewOverlayIcon"/>
+  <signal name="NewMenu"/>
+  <signal name="NewToolTip"/>
+  <signal name="NewStatus"><arg name="status" type="s"/></signal>
+  <signal name="NewIconThemePath"><arg name="icon_theme_path" type="s"/></signal>
+</interface>
+""",
+    "org.mpris.MediaPlayer2": """
+<interface name="org.mpris.MediaPlayer2">
+  <method name="Raise"/>
+  <method name="Quit"/>
+  <property name="CanQuit" type="b" access="read"/>
+  <property name="Fullscreen" type="b" access="readwrite"/>
+  <property name="CanSetFullscreen" type="b" access="read"/>
+  <property name="CanRaise" type="b" access="read"/>
+  <property name="HasTrackList" type="b" access="read"/>
+  <property name="Identity" type="s" access="read"/>
+  <property name="DesktopEntry" type="s" access="read"/>
+  <property name="SupportedUriSchemes" type="as" access="read"/>
+  <property name="SupportedMimeTypes" type="as" access="read"/>
+</interface>
+""",
+    "org.mpris.MediaPlayer2.Player": """
+<interface name="org.mpris.MediaPlayer2.Player">
+  <method name="Next"/>
+  <method name="Previous"/>
+  <method name="Pause"/>
+  <method name="PlayPause"/>
+  <method name="Stop"/>
+  <method name="Play"/>
+  <method name="Seek"><arg name="Offset" direction="in" type="x"/></method>
+  <method name="SetPosition">
+    <arg name="TrackId" direction="in" type="o"/>
+    <arg name="Position" direction="in" type="x"/>
+  </method>
+  <method name="OpenUri"><arg name="Uri" direction="in" type="s"/></method>
+  <signal name="Seeked"><arg name="Position" type="x"/></signal>
+  <property name="PlaybackStatus" type="s" access="read"/>
+  <property name="LoopStatus" type="s" access="readwrite"/>
+  <property name="Rate" type="d" access="readwrite"/>
+  <property name="Shuffle" type="b" access="readwrite"/>
+  <property name="Metadata" type="a{sv}" access="read"/>
+  <property name="Volume" type="d" access="readwrite"/>
+  <property name="Position" type="x" access="read"/>
+  <property name="MinimumRate" type="d" access="read"/>
+  <property name="MaximumRate" type="d" access="read"/>
+  <property name="CanGoNext" type="b" access="read"/>
+  <property name="CanGoPrevious" type="b" access="read"/>
+  <property name="CanPlay" type="b" access="read"/>
+  <property name="CanPause" type="b" access="read"/>
+  <property name="CanSeek" type="b" access="read"/>
+  <property name="CanControl" type="b" access="read"/>
+</interface>
+""",
+    "net.hadess.PowerProfiles": """
+<interface name="net.hadess.PowerProfiles">
+  <method name="HoldProfile">
+    <arg name="profile" direction="in" type="s"/>
+    <arg name="reason" direction="in" type="s"/>
+    <arg name="application_id" direction="in" type="s"/>
+    <arg name="cookie" direction="out" type="u"/>
+  </method>
+  <method name="ReleaseProfile">
+    <arg name="cookie" direction="in" type="u"/>
+  </method>
+  <signal name="ProfileReleased"><arg name="cookie" type="u"/></signal>
+  <property name="ActiveProfile" type="s" access="readwrite"/>
+  <property name="PerformanceInhibited" type="s" access="read"/>
+  <property name="PerformanceDegraded" type="s" access="read"/>
+  <property name="Profiles" type="aa{sv}" access="read"/>
+  <property name="Actions" type="as" access="read"/>
+  <property name="ActiveProfileHolds" type="aa{sv}" access="read"/>
+</interface>
+""",
+}
+
+_parsed_interfaces: Dict[str, intr.Interface] = dict()
+_introspection_cache = LruCache(INTROSPECTION_CACHE_SIZE)
+
+
+def get_known_interface(interface_name: str) -> Optional[intr.Interface]:
+    if interface_name not in _parsed_interfaces:
+        xml = KNOWN_INTERFACES.get(interface_name)
+        if xml is None:
+            return None
+        node = intr.Node.parse(f"<node>{xml}</node>")
+        _parsed_interfaces[interface_name] = node.interfaces[0]
+    return _parsed_interfaces[interface_name]
+
+
+async def get_proxy_object(
+    bus: MessageBus, bus_name: str, path: str, interface_names: Iterable[str] = ()
+) -> ProxyObject:
+    """Build a proxy object, introspecting only when needed.
+
+    If every interface in interface_names is known, the bundled introspection
+    data is used. Otherwise the result of introspecting (bus name, path) is
+    kept in an LRU cache, keyed by the unique name of the bus name's current
+    owner, so that a restarted service exporting different interfaces is
+    introspected again.
+    """
+    interfaces = [get_known_interface(name) for name in interface_names]
+    if interfaces and all(interfaces):
+        introspection = intr.Node(path, interfaces=interfaces)
+    else:
+        owner = await _get_owner(bus, bus_name)
+        if owner is None:
+            # Not running yet, introspecting may activate it
+            introspection = await bus.introspect(bus_name, path)
+        else:
+            key = (bus.unique_name, owner, path)
+            introspection = _introspection_cache.get(key)
+            if introspection is None:
+                introspection = await bus.introspect(bus_name, path)
+                _introspection_cache.put(key, introspection)
+    return bus.get_proxy_object(bus_name, path, introspection)
+
+
+async def _get_owner(bus: MessageBus, bus_name: str) -> Optional[str]:
+    if bus_name.startswith(":"):
+        return bus_name
+    reply = await bus.call(
+        Message(
+            destination="org.freedesktop.DBus",
+            path="/org/freedesktop/DBus",
+            interface="org.freedesktop.DBus",
+            member="GetNameOwner",
+            signature="s",
+            body=[bus_name],
+        )
+    )
+    if reply.message_type != MessageType.METHOD_RETURN:
+        return None
+    return reply.body[0]
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LruCache:
+    """Least-recently-used cache bounded by the total size of its values.
+
+    size_of gives the size of a value, counting every entry as 1 by default.
+    """
+
+    def __init__(self, max_size: int, size_of: Callable[[Any], int] = lambda _: 1):
+        self.max_size = max_size
+        self.size_of = size_of
+        self.size = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key not in self._entries:
+            return default
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: Hashable, value: Any):
+        self.pop(key)
+        size = self.size_of(value)
+        self._entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def pop(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        if key not in self._entries:
+            return default
+        value, size = self._entries.pop(key)
+        self.size -= size
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,297 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from dbus_next.errors import DBusError
+from dbus_next.message import Message
+from dbus_next.signature import Variant
+
+from ustatus.utils.bus import get_bus_manager, get_session_bus
+from ustatus.utils.introspection import get_proxy_object
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+MPRIS_PLAYER_INIT_TIMEOUT_SECONDS = 5
+
+
+class PlayerState:
+    """Last known values of a player's properties, used to tell which
+    properties in a PropertiesChanged signal actually changed."""
+
+    def __init__(self):
+        self.values: Dict[str, Any] = dict()
+
+    def get(self, key: str) -> Any:
+        return self.values.get(key)
+
+    def update(self, props: Dict[str, Any]) -> List[str]:
+        changed = []
+        for key, value in props.items():
+            if key not in self.values or self.values[key] != value:
+                self.values[key] = value
+                changed.append(key)
+        return changed
+
+
+class MprisPlayer:
+    def __init__(self, bus_name: str, owner: str, proxy_object):
+        self.bus_name = bus_name
+        self.owner = owner
+        self.interface = proxy_object.get_interface(MPRIS_PLAYER_INTERFACE)
+        self.properties_interface = proxy_object.get_interface(PROPERTIES_INTERFACE)
+        self.state = PlayerState()
+        self.set_position(0)
+
+    def set_position(self, position: int):
+        self.position = position
+        self.position_time = time.monotonic()
+
+    def get_position(self) -> int:
+        """Current position in microseconds, interpolated from the last known
+        one since MPRIS does not signal position changes during playback."""
+        position = self.position
+        if self.state.get("PlaybackStatus") == "Playing":
+            rate = self.state.get("Rate")
+            if rate is None:
+                rate = 1.0
+            position += int((time.monotonic() - self.position_time) * rate * 1e6)
+        length = self.get_length()
+        if length:
+            position = min(position, length)
+        return max(0, position)
+
+    def get_length(self) -> Optional[int]:
+        return self._get_metadata("mpris:length")
+
+    def get_track_id(self) -> Optional[str]:
+        return self._get_metadata("mpris:trackid")
+
+    def _get_metadata(self, key: str) -> Any:
+        metadata = self.state.get("Metadata")
+        variant = metadata.get(key) if metadata else None
+        return variant.value if variant is not None else None
+
+
+class MprisRegistry:
+    """Tracks every MPRIS player on the session bus.
+
+    Each player's properties are fetched with one GetAll when it appears and
+    then kept current from a single PropertiesChanged handler, dispatched by
+    sender. Players are ordered by when they last started playing, so the
+    most recently active one is found in O(1).
+
+    Listeners are called with (event, player, changed keys), where event is
+    "added", "changed" or "removed".
+    """
+
+    def __init__(self):
+        self.players: OrderedDict[str, MprisPlayer] = OrderedDict()
+        self.owners: Dict[str, List[str]] = dict()
+        self.listeners: List[Callable[[str, MprisPlayer, List[str]], None]] = []
+        self._pending: Dict[str, str] = dict()
+        self._start_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._start_task is None:
+            self._start_task = asyncio.create_task(self._start())
+        await asyncio.shield(self._start_task)
+
+    def add_listener(self, listener: Callable[[str, MprisPlayer, List[str]], None]):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, MprisPlayer, List[str]], None]):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def get_player(self, bus_name: str) -> Optional[MprisPlayer]:
+        return self.players.get(bus_name)
+
+    def get_most_recent(self) -> Optional[MprisPlayer]:
+        return next(reversed(self.players.values()), None)
+
+    async def _start(self):
+        self.bus = await get_session_bus()
+        manager = get_bus_manager()
+        await manager.add_signal_handler(
+            "org.freedesktop.DBus",
+            "NameOwnerChanged",
+            self._on_name_owner_changed,
+            sender="org.freedesktop.DBus",
+        )
+        await manager.add_signal_handler(
+            PROPERTIES_INTERFACE,
+            "PropertiesChanged",
+            self._on_properties_changed,
+            path=MPRIS_PATH,
+        )
+        await manager.add_signal_handler(
+            MPRIS_PLAYER_INTERFACE, "Seeked", self._on_seeked, path=MPRIS_PATH
+        )
+        proxy_object = await get_proxy_object(
+            self.bus,
+            "org.freedesktop.DBus",
+            "/org/freedesktop/DBus",
+            ["org.freedesktop.DBus"],
+        )
+        dbus_interface = proxy_object.get_interface("org.freedesktop.DBus")
+        names = [
+            name
+            for name in await dbus_interface.call_list_names()
+            if name.startswith(MPRIS_PREFIX)
+        ]
+        owners = await asyncio.gather(
+            *(dbus_interface.call_get_name_owner(name) for name in names),
+            return_exceptions=True,
+        )
+        results = await asyncio.gather(
+            *(
+                self._add_player(name, owner)
+                for name, owner in zip(names, owners)
+                if isinstance(owner, str)
+            ),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                logging.error("Failed to add MPRIS player", exc_info=result)
+
+    def _on_name_owner_changed(self, msg: Message):
+        name, old_owner, new_owner = msg.body
+        if not name.startswith(MPRIS_PREFIX):
+            return
+        if old_owner:
+            self._remove_player(name)
+        if new_owner:
+            asyncio.create_task(self._add_player(name, new_owner))
+
+    async def _add_player(self, bus_name: str, owner: str):
+        self._pending[bus_name] = owner
+        try:
+            proxy_object = await get_proxy_object(
+                self.bus,
+                bus_name,
+                MPRIS_PATH,
+                [MPRIS_PLAYER_INTERFACE, PROPERTIES_INTERFACE],
+            )
+            player = MprisPlayer(bus_name, owner, proxy_object)
+            properties = await asyncio.wait_for(
+                player.properties_interface.call_get_all(MPRIS_PLAYER_INTERFACE),
+                MPRIS_PLAYER_INIT_TIMEOUT_SECONDS,
+            )
+        except Exception as e:
+            if isinstance(e, (DBusError, asyncio.TimeoutError)):
+                logging.warning(f"Failed to read MPRIS player {bus_name}: {e!r}")
+            else:
+                logging.exception(f"Failed to read MPRIS player {bus_name}")
+            if self._pending.get(bus_name) == owner:
+                del self._pending[bus_name]
+            return
+        if self._pending.get(bus_name) != owner:
+            # Replaced or gone while its properties were being fetched
+            return
+        del self._pending[bus_name]
+        props = {key: value.value for key, value in properties.items()}
+        player.set_position(props.pop("Position", 0))
+        player.state.update(props)
+        self.players[bus_name] = player
+        self.owners.setdefault(owner, []).append(bus_name)
+        if player.state.get("PlaybackStatus") != "Playing":
+            self.players.move_to_end(bus_name, last=False)
+        self._notify("added", player, list(player.state.values))
+
+    def _remove_player(self, bus_name: str):
+        self._pending.pop(bus_name, None)
+        player = self.players.pop(bus_name, None)
+        if player is None:
+            return
+        names = self.owners.get(player.owner, [])
+        if bus_name in names:
+            names.remove(bus_name)
+            if not names:
+                del self.owners[player.owner]
+        self._notify("removed", player, [])
+
+    def _get_players(self, owner: str) -> List[MprisPlayer]:
+        # A player may own several names for the same object
+        return [self.players[name] for name in self.owners.get(owner, [])]
+
+    def _on_seeked(self, msg: Message):
+        for player in self._get_players(msg.sender):
+            player.set_position(msg.body[0])
+            self._notify("changed", player, ["Position"])
+
+    def _on_properties_changed(self, msg: Message):
+        players = self._get_players(msg.sender)
+        if not players:
+            return
+        interface_name, changed, invalidated = msg.body
+        if interface_name != MPRIS_PLAYER_INTERFACE:
+            return
+        props = {key: value.value for key, value in changed.items()}
+        for player in players:
+            self._update_player(player, props)
+            if invalidated:
+                asyncio.create_task(self._fetch_invalidated(player, invalidated))
+
+    async def _fetch_invalidated(self, player: MprisPlayer, keys: List[str]):
+        values = dict()
+        for key in keys:
+            try:
+                variant: Variant = await player.properties_interface.call_get(
+                    MPRIS_PLAYER_INTERFACE, key
+                )
+            except DBusError:
+                continue
+            values[key] = variant.value
+        if self.players.get(player.bus_name) is player:
+            self._update_player(player, values)
+
+    def _update_player(self, player: MprisPlayer, props: Dict[str, Any]):
+        track_id = player.get_track_id()
+        if "PlaybackStatus" in props or "Rate" in props:
+            # Keep the interpolated position until the real one is read
+            player.set_position(player.get_position())
+        if "Position" in props:
+            props = dict(props)
+            player.set_position(props.pop("Position"))
+            self._notify("changed", player, ["Position"])
+        changed = player.state.update(props)
+        if not changed:
+            return
+        if "PlaybackStatus" in changed and props["PlaybackStatus"] == "Playing":
+            self.players.move_to_end(player.bus_name)
+        if player.get_track_id() != track_id:
+            player.set_position(0)
+            changed.append("Position")
+        # The position is only read again when interpolating it would go wrong
+        if "PlaybackStatus" in changed or "Rate" in changed or "Position" in changed:
+            asyncio.create_task(self._fetch_position(player))
+        self._notify("changed", player, changed)
+
+    async def _fetch_position(self, player: MprisPlayer):
+        try:
+            variant: Variant = await player.properties_interface.call_get(
+                MPRIS_PLAYER_INTERFACE, "Position"
+            )
+        except DBusError:
+            return
+        if self.players.get(player.bus_name) is player:
+            player.set_position(variant.value)
+            self._notify("changed", player, ["Position"])
+
+    def _notify(self, event: str, player: MprisPlayer, changed: List[str]):
+        for listener in list(self.listeners):
+            listener(event, player, changed)
+
+
+_registry: Optional[MprisRegistry] = None
+
+
+def get_mpris_registry() -> MprisRegistry:
+    global _registry
+    if _registry is None:
+        _registry = MprisRegistry()
+    return _registry
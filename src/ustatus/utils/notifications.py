@@ -1,7 +1,16 @@
 import logging
-from gi.repository import Notify
 from typing import Optional
 
+_app_name: Optional[str] = None
+_initialized = False
+
+
+def init_notifications(app_name: str):
+    """Set the application name notifications are sent as. libnotify itself
+    is only loaded once the first notification is sent."""
+    global _app_name
+    _app_name = app_name
+
 
 def notify_error(summary: Optional[str] = None, body: Optional[str] = None):
     if summary is None:
@@ -11,6 +20,20 @@ def notify_error(summary: Optional[str] = None, body: Optional[str] = None):
 
     logging.error(f"{summary}: {body}")
 
+    Notify = _get_notify()
     notification = Notify.Notification.new(summary, body, "dialog-error")
     notification.set_urgency(2)
     notification.show()
+
+
+def _get_notify():
+    global _initialized
+    import gi
+
+    gi.require_version("Notify", "0.7")
+    from gi.repository import Notify
+
+    if not _initialized:
+        Notify.init(_app_name or "ustatus")
+        _initialized = True
+    return Notify
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+from gi.repository import Gdk
+
+from ustatus.utils.swaymsg import get_event_hub, get_outputs
+
+
+class OutputRegistry:
+    """Cached mapping from sway output names to Gdk monitors.
+
+    Sway output metadata is fetched once and refreshed only on sway `output`
+    events. Monitors are matched on make and model, with the output position
+    telling identical monitors apart, and the mapping is patched from the
+    display's monitor-added/monitor-removed signals. Listeners registered for
+    an output name are called with the new monitor (or None) on every change.
+    """
+
+    def __init__(self, display: Gdk.Display):
+        self.display = display
+        self.outputs: Dict[str, Dict] = dict()
+        self.monitors: Dict[str, Gdk.Monitor] = dict()
+        self.listeners: Dict[str, List[Callable]] = dict()
+        self._start_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._start_task is None:
+            self._start_task = asyncio.create_task(self._start())
+        await asyncio.shield(self._start_task)
+
+    def get_monitor(self, output_name: str) -> Optional[Gdk.Monitor]:
+        return self.monitors.get(output_name)
+
+    def add_listener(self, output_name: str, callback: Callable):
+        self.listeners.setdefault(output_name, []).append(callback)
+
+    def remove_listener(self, output_name: str, callback: Callable):
+        listeners = self.listeners.get(output_name, [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    async def _start(self):
+        self.display.connect("monitor-added", self._on_monitor_added)
+        self.display.connect("monitor-removed", self._on_monitor_removed)
+        await get_event_hub().subscribe(
+            "output", lambda _: asyncio.create_task(self._refresh_outputs())
+        )
+        await self._refresh_outputs()
+
+    async def _refresh_outputs(self):
+        outputs = await get_outputs()
+        self.outputs = {o["name"]: o for o in outputs if o.get("active", True)}
+        monitors = [
+            self.display.get_monitor(num)
+            for num in range(self.display.get_n_monitors())
+        ]
+        for name in set(self.monitors) | set(self.outputs):
+            output = self.outputs.get(name)
+            monitor = self._match(output, monitors) if output else None
+            self._set_monitor(name, monitor)
+
+    def _on_monitor_added(self, display, monitor: Gdk.Monitor):
+        names = [
+            name
+            for name, output in self.outputs.items()
+            if name not in self.monitors and self._match(output, [monitor])
+        ]
+        if len(names) > 1:
+            geometry = monitor.get_geometry()
+            names = [
+                name
+                for name in names
+                if self.outputs[name].get("rect", dict()).get("x") == geometry.x
+                and self.outputs[name].get("rect", dict()).get("y") == geometry.y
+            ] or names
+        if names:
+            self._set_monitor(names[0], monitor)
+        else:
+            logging.info(
+                f"Monitor {monitor.get_manufacturer()} {monitor.get_model()} added, "
+                "waiting for sway output event"
+            )
+
+    def _on_monitor_removed(self, display, monitor: Gdk.Monitor):
+        for name in [n for n, m in self.monitors.items() if m == monitor]:
+            self._set_monitor(name, None)
+
+    def _set_monitor(self, name: str, monitor: Optional[Gdk.Monitor]):
+        if self.monitors.get(name) == monitor:
+            return
+        if monitor is None:
+            self.monitors.pop(name, None)
+        else:
+            self.monitors[name] = monitor
+        for callback in list(self.listeners.get(name, [])):
+            callback(monitor)
+
+    @staticmethod
+    def _match(output: Dict, monitors: List[Gdk.Monitor]) -> Optional[Gdk.Monitor]:
+        candidates = [
+            m
+            for m in monitors
+            if m.get_model() == output.get("model")
+            and m.get_manufacturer() in (None, output.get("make"))
+        ]
+        if len(candidates) > 1:
+            rect = output.get("rect", dict())
+            for m in candidates:
+                geometry = m.get_geometry()
+                if geometry.x == rect.get("x") and geometry.y == rect.get("y"):
+                    return m
+        return candidates[0] if candidates else None
+
+
+_output_registry: Optional[OutputRegistry] = None
+
+
+def get_output_registry() -> OutputRegistry:
+    global _output_registry
+    if _output_registry is None:
+        _output_registry = OutputRegistry(Gdk.Display.get_default())
+    return _output_registry
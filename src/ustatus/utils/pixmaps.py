@@ -0,0 +1,105 @@
+import hashlib
+from typing import List, Optional, Sequence, Tuple
+from gi.repository import GdkPixbuf, GLib
+
+from ustatus.utils.lru import LruCache
+
+PIXBUF_CACHE_BYTES = 8 * 1024 * 1024
+
+Pixmap = Tuple[int, int, bytes]
+
+_pixbuf_cache = LruCache(
+    PIXBUF_CACHE_BYTES, size_of=lambda pixbuf: pixbuf.get_byte_length()
+)
+
+
+def select_pixmap(pixmaps: Sequence[Pixmap], size: int) -> Optional[Pixmap]:
+    """Pick the smallest pixmap at least size pixels wide and tall, falling
+    back to the largest one."""
+    valid = [
+        p for p in pixmaps if p[0] > 0 and p[1] > 0 and len(p[2]) >= p[0] * p[1] * 4
+    ]
+    if not valid:
+        return None
+    large_enough = [p for p in valid if min(p[0], p[1]) >= size]
+    if large_enough:
+        return min(large_enough, key=lambda p: p[0] * p[1])
+    return max(valid, key=lambda p: p[0] * p[1])
+
+
+def argb_to_rgba(data) -> bytearray:
+    """Convert network-order ARGB32 pixels to the RGBA layout of GdkPixbuf,
+    moving each channel with one strided slice copy.
+
+    data may be any bytes-like object, such as a memoryview of a larger buffer.
+    """
+    rgba = bytearray(len(data))
+    rgba[0::4] = data[1::4]
+    rgba[1::4] = data[2::4]
+    rgba[2::4] = data[3::4]
+    rgba[3::4] = data[0::4]
+    return rgba
+
+
+def pixbuf_from_pixmaps(
+    pixmaps: Sequence[Pixmap], size: int
+) -> Optional[GdkPixbuf.Pixbuf]:
+    """Decode StatusNotifierItem pixmaps into a pixbuf of at most size pixels.
+
+    Decoded pixbufs are cached by content hash, so a pixmap that is sent again
+    is not decoded again.
+    """
+    pixmap = select_pixmap(pixmaps, size)
+    if pixmap is None:
+        return None
+    width, height, data = pixmap
+    data = memoryview(data)[: width * height * 4]
+    key = (hashlib.blake2b(data, digest_size=16).digest(), width, height, size)
+    pixbuf = _pixbuf_cache.get(key)
+    if pixbuf is not None:
+        return pixbuf
+    pixbuf = GdkPixbuf.Pixbuf.new_from_bytes(
+        GLib.Bytes.new(argb_to_rgba(data)),
+        GdkPixbuf.Colorspace.RGB,
+        True,
+        8,
+        width,
+        height,
+        width * 4,
+    )
+    if max(width, height) != size:
+        scale = size / max(width, height)
+        pixbuf = pixbuf.scale_simple(
+            max(1, round(width * scale)),
+            max(1, round(height * scale)),
+            GdkPixbuf.InterpType.BILINEAR,
+        )
+    _pixbuf_cache.put(key, pixbuf)
+    return pixbuf
+
+
+def compose_overlay(
+    base: GdkPixbuf.Pixbuf, overlay: GdkPixbuf.Pixbuf
+) -> GdkPixbuf.Pixbuf:
+    composed = base.copy()
+    width, height = base.get_width(), base.get_height()
+    overlay.composite(
+        composed,
+        0,
+        0,
+        width,
+        height,
+        0,
+        0,
+        width / overlay.get_width(),
+        height / overlay.get_height(),
+        GdkPixbuf.InterpType.BILINEAR,
+        255,
+    )
+    return composed
+
+
+def as_pixmaps(value) -> List[Pixmap]:
+    if not value:
+        return []
+    return [(int(w), int(h), bytes(data)) for w, h, data in value]
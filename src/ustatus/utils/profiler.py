@@ -0,0 +1,172 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Set
+
+STARTUP_REPORT_TIMEOUT_SECONDS = 10
+
+# Import this module first to include the time spent importing everything else
+_origin = time.perf_counter()
+
+
+class Phase:
+    def __init__(self, name: str, start: float, end: Optional[float] = None):
+        self.name = name
+        self.start = start
+        self.end = end
+
+    def as_dict(self, origin: float) -> Dict:
+        return {
+            "phase": self.name,
+            "start_ms": round((self.start - origin) * 1e3, 3),
+            "duration_ms": round(((self.end or self.start) - self.start) * 1e3, 3),
+        }
+
+
+class StartupProfiler:
+    """Timestamps the phases of startup, from the first import up to the first
+    draw of every module.
+
+    Phases are recorded from import time, since it only costs a perf_counter
+    call, until the config says whether a report was asked for with
+    --profile-startup or --startup-budget. Without one, recording stops there;
+    with one, it stops once the report is produced. Either way, bars created
+    later by a daemon or a config reload do not grow it.
+    """
+
+    def __init__(self):
+        self.origin = _origin
+        self.phases: List[Phase] = []
+        self.pending_draws: Set[str] = set()
+        self.format: Optional[str] = None
+        self.budgets: Dict[str, float] = dict()
+        self.on_budget_exceeded: Optional[Callable[[], None]] = None
+        self.reported = False
+        self.failed = False
+
+    def configure(
+        self,
+        format: Optional[str],
+        budgets: Dict[str, float],
+        on_budget_exceeded: Optional[Callable[[], None]] = None,
+    ):
+        self.format = format
+        self.budgets = budgets
+        self.on_budget_exceeded = on_budget_exceeded
+        if format is not None or budgets:
+            from gi.repository import GLib
+
+            GLib.timeout_add_seconds(STARTUP_REPORT_TIMEOUT_SECONDS, self.report)
+        else:
+            # Nobody asked for a report, so stop recording right away
+            self.reported = True
+            self.phases.clear()
+            self.pending_draws.clear()
+
+    @contextmanager
+    def phase(self, name: str):
+        phase = Phase(name, time.perf_counter())
+        if not self.reported:
+            self.phases.append(phase)
+        try:
+            yield phase
+        finally:
+            phase.end = time.perf_counter()
+
+    def record(self, name: str, start: float, end: Optional[float] = None):
+        if not self.reported:
+            self.phases.append(Phase(name, start, end or time.perf_counter()))
+
+    def mark(self, name: str):
+        if not self.reported:
+            self.phases.append(Phase(name, time.perf_counter()))
+
+    def expect_draw(self, widget, name: str):
+        """Record when widget is first drawn, and report once every expected
+        widget has been drawn."""
+        if self.reported:
+            return
+        self.pending_draws.add(name)
+        handler_id = None
+
+        def on_draw(*_):
+            widget.disconnect(handler_id)
+            self.mark(f"first draw {name}")
+            self.pending_draws.discard(name)
+            if not self.pending_draws:
+                from gi.repository import GLib
+
+                GLib.idle_add(self.report)
+            return False
+
+        handler_id = widget.connect("draw", on_draw)
+
+    def report(self):
+        if self.reported or (self.format is None and not self.budgets):
+            return False
+        self.reported = True
+        total = Phase("total", self.origin, max(p.end or p.start for p in self.phases))
+        rows = []
+        for phase in self.phases + [total]:
+            row = phase.as_dict(self.origin)
+            budget = self.budgets.get(phase.name)
+            if budget is not None:
+                # Marks, such as first draws, are budgeted by when they happen
+                elapsed = row["duration_ms"] if phase.end else row["start_ms"]
+                row["budget_ms"] = budget
+                row["over_budget"] = elapsed > budget
+                self.failed = self.failed or row["over_budget"]
+            rows.append(row)
+        missing = sorted(self.pending_draws)
+
+        if self.format == "json":
+            print(json.dumps({"phases": rows, "not_drawn": missing}, indent=2))
+        elif self.format == "table":
+            print(format_table(rows))
+            if missing:
+                print(
+                    f"not drawn after {STARTUP_REPORT_TIMEOUT_SECONDS}s: {', '.join(missing)}"
+                )
+        for row in rows:
+            if row.get("over_budget"):
+                logging.error(
+                    f"Startup phase {row['phase']} is over its budget of "
+                    f"{row['budget_ms']:.1f}ms"
+                )
+        if self.failed and self.on_budget_exceeded is not None:
+            self.on_budget_exceeded()
+        return False
+
+
+def format_table(rows: List[Dict]) -> str:
+    width = max(len(row["phase"]) for row in rows)
+    lines = [f"{'phase':<{width}}  {'start ms':>10}  {'duration ms':>11}  budget ms"]
+    for row in rows:
+        budget = row.get("budget_ms")
+        budget_column = "" if budget is None else f"{budget:9.1f}"
+        if row.get("over_budget"):
+            budget_column += "  OVER"
+        lines.append(
+            f"{row['phase']:<{width}}  {row['start_ms']:>10.1f}  "
+            f"{row['duration_ms']:>11.1f}  {budget_column}"
+        )
+    return "\n".join(lines)
+
+
+def parse_budget(value: str):
+    """Parse a PHASE=MILLISECONDS command line budget."""
+    phase, separator, milliseconds = value.rpartition("=")
+    if not separator or not phase:
+        raise ValueError(f"expected PHASE=MILLISECONDS, got {value}")
+    return phase, float(milliseconds)
+
+
+_profiler: Optional[StartupProfiler] = None
+
+
+def get_startup_profiler() -> StartupProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = StartupProfiler()
+    return _profiler
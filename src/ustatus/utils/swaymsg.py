@@ -1,5 +1,652 @@
 import asyncio
 import json
+import logging
+import os
+import re
+import struct
+from collections import deque
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+IPC_MAGIC = b"i3-ipc"
+IPC_HEADER = struct.Struct("=6sII")
+EVENT_MASK = 0x80000000
+STREAM_CHUNK_SIZE = 64 * 1024
+TREE_RESYNC_DELAY_SECONDS = 0.05
+RECONNECT_DELAY_SECONDS = 1
+RECONNECT_MAX_DELAY_SECONDS = 30
+
+
+class MessageType(IntEnum):
+    RUN_COMMAND = 0
+    GET_WORKSPACES = 1
+    SUBSCRIBE = 2
+    GET_OUTPUTS = 3
+    GET_TREE = 4
+    GET_MARKS = 5
+    GET_BAR_CONFIG = 6
+    GET_VERSION = 7
+    GET_BINDING_MODES = 8
+    GET_CONFIG = 9
+    SEND_TICK = 10
+    GET_INPUTS = 100
+    GET_SEATS = 101
+
+
+EVENT_NAMES = {
+    0x80000000: "workspace",
+    0x80000001: "output",
+    0x80000002: "mode",
+    0x80000003: "window",
+    0x80000004: "barconfig_update",
+    0x80000005: "binding",
+    0x80000006: "shutdown",
+    0x80000007: "tick",
+    0x80000014: "bar_state_update",
+    0x80000015: "input",
+}
+
+
+class SwayIpcError(Exception):
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return f"SwayIpcError: {self.message}"
+
+
+class SwayIpcConnection:
+    """Connection to the sway IPC socket speaking the i3-ipc binary protocol.
+
+    Requests are pipelined: they are written as soon as they are issued, and a
+    single reader task matches the replies (which sway sends in request order)
+    to their futures. Events received on a subscribed connection are passed to
+    on_event as (message type, raw payload).
+    """
+
+    def __init__(
+        self,
+        socket_path: str,
+        on_event: Optional[Callable[[int, bytes], None]] = None,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        self.socket_path = socket_path
+        self.on_event = on_event
+        self.on_close = on_close
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Deque[asyncio.Future] = deque()
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            self.socket_path
+        )
+
+    def is_connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def send(self, message_type: int, payload: str = ""):
+        if not self.is_connected():
+            raise SwayIpcError(f"Not connected to {self.socket_path}")
+        assert self._writer is not None
+        data = payload.encode()
+        self._writer.write(IPC_HEADER.pack(IPC_MAGIC, len(data), message_type) + data)
+
+    async def read_message(self) -> Tuple[int, bytes]:
+        assert self._reader is not None
+        magic, length, message_type = IPC_HEADER.unpack(
+            await self._reader.readexactly(IPC_HEADER.size)
+        )
+        if magic != IPC_MAGIC:
+            raise SwayIpcError(f"Invalid magic string {magic!r}")
+        return message_type, await self._reader.readexactly(length)
+
+    async def request(self, message_type: int, payload: str = "") -> Any:
+        if self._reader_task is None:
+            self._reader_task = asyncio.create_task(self._read_replies())
+        future = asyncio.get_running_loop().create_future()
+        self.send(message_type, payload)
+        self._pending.append(future)
+        assert self._writer is not None
+        await self._writer.drain()
+        return json.loads(await future)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._fail_pending(SwayIpcError(f"Connection to {self.socket_path} closed"))
+
+    def _fail_pending(self, exception: Exception):
+        while self._pending:
+            future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(exception)
+
+    async def _read_replies(self):
+        try:
+            while True:
+                message_type, payload = await self.read_message()
+                if message_type & EVENT_MASK:
+                    if self.on_event is not None:
+                        self.on_event(message_type, payload)
+                    continue
+                future = self._pending.popleft()
+                if not future.done():
+                    future.set_result(payload)
+        except (asyncio.IncompleteReadError, ConnectionError, SwayIpcError) as e:
+            if self._writer is not None:
+                self._writer.close()
+            self._reader_task = None
+            self._fail_pending(SwayIpcError(f"Lost connection to sway: {e}"))
+            if self.on_close is not None:
+                self.on_close()
+
+
+class JsonStreamFramer:
+    """Incrementally splits a stream of concatenated JSON documents.
+
+    Input is appended to a single reusable buffer and scanned only once: a
+    regex skips over whole strings and jumps between structural characters, so
+    the work done per document is linear in its size. Braces and brackets
+    inside strings are ignored.
+    """
+
+    # A complete string, a structural character, or the opening quote of a
+    # string that is not complete yet
+    _TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]|"', re.DOTALL)
+    _STRING_END = re.compile(rb'["\\]')
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._scan_pos = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, data: bytes) -> List[Any]:
+        self._buffer += data
+        documents = []
+        consumed = 0
+        buffer = self._buffer
+        pos = self._scan_pos
+        end = len(buffer)
+        while pos < end:
+            if self._in_string:
+                match = self._STRING_END.search(buffer, pos)
+                if match is None:
+                    pos = end
+                    break
+                pos = match.end()
+                if match.group() == b"\\":
+                    if pos >= end:
+                        # Escape split across chunks, rescan it with the next one
+                        pos -= 1
+                        break
+                    pos += 1
+                else:
+                    self._in_string = False
+                continue
+            match = self._TOKEN.search(buffer, pos)
+            if match is None:
+                pos = end
+                break
+            char = buffer[match.start()]
+            pos = match.end()
+            if char == 0x22:  # '"'
+                if pos - match.start() == 1:
+                    self._in_string = True
+            elif char in (0x7B, 0x5B):  # '{', '['
+                if self._depth == 0:
+                    self._start = match.start()
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    with memoryview(buffer) as view:
+                        document = bytes(view[self._start : pos])
+                    documents.append(json.loads(document))
+                    self._start = None
+                    consumed = pos
+        if self._depth == 0 and not self._in_string:
+            # Only whitespace separators remain after the last document
+            consumed = pos
+        if consumed:
+            del buffer[:consumed]
+            pos -= consumed
+            if self._start is not None:
+                self._start -= consumed
+        self._scan_pos = pos
+        return documents
+
+
+class SwayEventSubscription:
+    def __init__(
+        self,
+        hub: "SwayEventHub",
+        event_type: str,
+        callback: Callable[[Dict], None],
+        output: Optional[str],
+        changes: Optional[Iterable[str]],
+    ):
+        self.hub = hub
+        self.event_type = event_type
+        self.callback = callback
+        self.output = output
+        self.changes = tuple(changes) if changes is not None else None
+
+    def unsubscribe(self):
+        self.hub.unsubscribe(self)
+
+
+class SwayEventHub:
+    """Process-wide fan-out of sway events.
+
+    Every event type is subscribed to at most once, on a single IPC connection
+    shared by the whole process, and each event is decoded once. Subscribers
+    are indexed by event type and change, so they are only called for the
+    events they asked for; workspace events are also filtered by output.
+    A subscriber that raises is logged without affecting the others, and a
+    lost connection is re-established with the same subscriptions.
+    """
+
+    def __init__(self):
+        self._connection: Optional[SwayIpcConnection] = None
+        self._lock = asyncio.Lock()
+        self._subscribed: Set[str] = set()
+        self._stream_tasks: Dict[str, asyncio.Task] = dict()
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._subscribers: Dict[
+            str, Dict[Optional[str], List[SwayEventSubscription]]
+        ] = dict()
+
+    async def subscribe(
+        self,
+        event_type: str,
+        callback: Callable[[Dict], None],
+        output: Optional[str] = None,
+        changes: Optional[Iterable[str]] = None,
+    ) -> SwayEventSubscription:
+        subscription = SwayEventSubscription(
+            self, event_type, callback, output, changes
+        )
+        by_change = self._subscribers.setdefault(event_type, dict())
+        for change in subscription.changes or (None,):
+            by_change.setdefault(change, []).append(subscription)
+        try:
+            await self._ensure_subscribed()
+        except BaseException:
+            self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    def unsubscribe(self, subscription: SwayEventSubscription):
+        by_change = self._subscribers.get(subscription.event_type, dict())
+        for change in subscription.changes or (None,):
+            subscribers = by_change.get(change, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                by_change.pop(change, None)
+        if not by_change:
+            # Sway cannot unsubscribe, but the event type is no longer
+            # subscribed to again after a reconnect
+            self._subscribers.pop(subscription.event_type, None)
+
+    async def _ensure_subscribed(self):
+        async with self._lock:
+            socket_path = get_socket_path()
+            missing = [t for t in self._subscribers if t not in self._subscribed]
+            if not missing:
+                return
+            if socket_path is None:
+                for event_type in missing:
+                    self._stream_tasks[event_type] = asyncio.create_task(
+                        self._dispatch_stream(event_type)
+                    )
+                    self._subscribed.add(event_type)
+                return
+            if self._connection is None or not self._connection.is_connected():
+                self._connection = SwayIpcConnection(
+                    socket_path,
+                    on_event=self._dispatch_payload,
+                    on_close=self._on_close,
+                )
+                await self._connection.connect()
+            reply = await self._connection.request(
+                MessageType.SUBSCRIBE, json.dumps(missing)
+            )
+            if not reply.get("success", False):
+                raise SwayIpcError(f"Failed to subscribe to {missing}")
+            self._subscribed.update(missing)
+
+    def _on_close(self):
+        self._connection = None
+        self._subscribed.clear()
+        if self._subscribers and self._reconnect_task is None:
+            logging.warning("Lost connection to sway, reconnecting")
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = RECONNECT_DELAY_SECONDS
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    await self._ensure_subscribed()
+                    logging.info("Reconnected to sway")
+                    return
+                except (OSError, SwayIpcError) as e:
+                    logging.warning(f"Failed to reconnect to sway: {e}")
+                    delay = min(delay * 2, RECONNECT_MAX_DELAY_SECONDS)
+        finally:
+            self._reconnect_task = None
+
+    async def _dispatch_stream(self, event_type: str):
+        async for event in run_stream(
+            ["swaymsg", "--monitor", "-t", "subscribe", json.dumps([event_type])]
+        ):
+            self._dispatch(event_type, event)
+
+    def _dispatch_payload(self, message_type: int, payload: bytes):
+        event_type = EVENT_NAMES.get(message_type)
+        if event_type in self._subscribers:
+            try:
+                event = json.loads(payload)
+            except ValueError as e:
+                logging.warning(f"Ignoring malformed sway {event_type} event: {e}")
+                return
+            self._dispatch(event_type, event)
+
+    def _dispatch(self, event_type: str, event: Dict):
+        by_change = self._subscribers.get(event_type)
+        if not by_change:
+            return
+        subscribers = by_change.get(event.get("change"), []) + by_change.get(None, [])
+        if not subscribers:
+            return
+        output = _get_event_output(event)
+        for subscription in subscribers:
+            if (
+                subscription.output is None
+                or output is None
+                or subscription.output == output
+            ):
+                try:
+                    subscription.callback(event)
+                except Exception:
+                    logging.exception(f"Sway {event_type} event subscriber failed")
+
+
+def _get_event_output(event: Dict) -> Optional[str]:
+    current = event.get("current")
+    if isinstance(current, dict):
+        return current.get("output")
+    return None
+
+
+_event_hub: Optional[SwayEventHub] = None
+
+
+def get_event_hub() -> SwayEventHub:
+    global _event_hub
+    if _event_hub is None:
+        _event_hub = SwayEventHub()
+    return _event_hub
+
+
+class SwayTree:
+    """In-memory mirror of the sway container tree.
+
+    The tree is loaded once with get_tree and then patched from window and
+    workspace events. Containers are indexed by id and windows are indexed by
+    workspace, so window counts and urgency are O(1) lookups. Window events do
+    not say which workspace a window is on: new windows are attached to the
+    focused workspace right away, and new windows and moves are reconciled
+    with a single get_tree per burst of events. Listeners are called with the id of every workspace whose
+    windows or urgency changed.
+    """
+
+    def __init__(self):
+        self.containers: Dict[int, Dict] = dict()
+        self.workspaces: Dict[int, Dict] = dict()
+        self.workspace_of: Dict[int, int] = dict()
+        self.windows: Dict[int, Set[int]] = dict()
+        self.urgent_windows: Dict[int, Set[int]] = dict()
+        self.focused_workspace: Optional[int] = None
+        self.listeners: List[Callable[[int], None]] = []
+        self._start_task: Optional[asyncio.Task] = None
+        self._resync_handle: Optional[asyncio.TimerHandle] = None
+        self._resync_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._start_task is None:
+            self._start_task = asyncio.create_task(self._start())
+        await asyncio.shield(self._start_task)
+
+    def add_listener(self, callback: Callable[[int], None]):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[int], None]):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def get_container(self, id: int) -> Optional[Dict]:
+        return self.containers.get(id)
+
+    def get_workspace_id(self, container_id: int) -> Optional[int]:
+        return self.workspace_of.get(container_id)
+
+    def get_window_count(self, workspace_id: int) -> int:
+        return len(self.windows.get(workspace_id, ()))
+
+    def is_urgent(self, workspace_id: int) -> bool:
+        workspace = self.workspaces.get(workspace_id)
+        return bool(self.urgent_windows.get(workspace_id)) or bool(
+            workspace and workspace.get("urgent")
+        )
+
+    async def _start(self):
+        hub = get_event_hub()
+        await hub.subscribe("window", self._on_window_event)
+        await hub.subscribe("workspace", self._on_workspace_event)
+        await self._resync()
+
+    def load(self, tree: Dict):
+        changed = set(self.workspaces)
+        self.containers.clear()
+        self.workspaces.clear()
+        self.workspace_of.clear()
+        self.windows.clear()
+        self.urgent_windows.clear()
+        for output in tree.get("nodes", []):
+            for workspace in output.get("nodes", []):
+                if workspace.get("type") == "workspace":
+                    self._add_workspace(workspace)
+                    if self._contains_focus(workspace):
+                        self.focused_workspace = workspace["id"]
+        self._notify(changed | set(self.workspaces))
+
+    def _add_workspace(self, workspace: Dict):
+        id = workspace["id"]
+        self.workspaces[id] = workspace
+        self.containers[id] = workspace
+        self.windows[id] = set()
+        self.urgent_windows[id] = set()
+        stack = list(workspace.get("nodes", [])) + list(
+            workspace.get("floating_nodes", [])
+        )
+        while stack:
+            node = stack.pop()
+            self.containers[node["id"]] = node
+            children = node.get("nodes", []) + node.get("floating_nodes", [])
+            if children:
+                stack.extend(children)
+            else:
+                self._attach_window(node, id)
+
+    @staticmethod
+    def _contains_focus(workspace: Dict) -> bool:
+        stack = [workspace]
+        while stack:
+            node = stack.pop()
+            if node.get("focused"):
+                return True
+            stack.extend(node.get("nodes", []) + node.get("floating_nodes", []))
+        return False
+
+    def _attach_window(self, container: Dict, workspace_id: int):
+        id = container["id"]
+        self.containers[id] = container
+        self.workspace_of[id] = workspace_id
+        self.windows.setdefault(workspace_id, set()).add(id)
+        if container.get("urgent"):
+            self.urgent_windows.setdefault(workspace_id, set()).add(id)
+
+    def _detach_window(self, id: int) -> Optional[int]:
+        self.containers.pop(id, None)
+        workspace_id = self.workspace_of.pop(id, None)
+        if workspace_id is not None:
+            self.windows.get(workspace_id, set()).discard(id)
+            self.urgent_windows.get(workspace_id, set()).discard(id)
+        return workspace_id
+
+    def _remove_workspace(self, id: int):
+        for window in list(self.windows.get(id, ())):
+            self._detach_window(window)
+        self.workspaces.pop(id, None)
+        self.containers.pop(id, None)
+        self.windows.pop(id, None)
+        self.urgent_windows.pop(id, None)
+
+    def _on_window_event(self, event: Dict):
+        container = event.get("container")
+        if not container:
+            return
+        id = container["id"]
+        workspace_id = self.workspace_of.get(id)
+        match event["change"]:
+            case "new":
+                # Usually opened on the focused workspace, but assign rules
+                # may put it elsewhere, which only the tree says
+                if self.focused_workspace is not None:
+                    self._attach_window(container, self.focused_workspace)
+                    workspace_id = self.focused_workspace
+                self._schedule_resync()
+            case "close":
+                workspace_id = self._detach_window(id)
+            case "move":
+                self._schedule_resync()
+                return
+            case "urgent":
+                if workspace_id is not None:
+                    urgent = self.urgent_windows.setdefault(workspace_id, set())
+                    if container.get("urgent"):
+                        urgent.add(id)
+                    else:
+                        urgent.discard(id)
+                    self.containers[id] = container
+            case "focus":
+                if workspace_id is not None:
+                    self.focused_workspace = workspace_id
+                    self.containers[id] = container
+                return
+            case _:
+                if id in self.containers:
+                    self.containers[id] = container
+                return
+        if workspace_id is not None:
+            self._notify((workspace_id,))
+
+    def _on_workspace_event(self, event: Dict):
+        current = event.get("current")
+        match event["change"]:
+            case "init":
+                self._add_workspace(current)
+            case "empty":
+                self._remove_workspace(current["id"])
+            case "focus":
+                self.focused_workspace = current["id"]
+                return
+            case "urgent" | "rename" | "move":
+                workspace = self.workspaces.get(current["id"])
+                if workspace is None:
+                    return
+                for key in ("name", "num", "output", "urgent"):
+                    if key in current:
+                        workspace[key] = current[key]
+            case "reload":
+                self._schedule_resync()
+                return
+            case _:
+                return
+        self._notify((current["id"],))
+
+    def _schedule_resync(self):
+        if self._resync_handle is None:
+            self._resync_handle = asyncio.get_running_loop().call_later(
+                TREE_RESYNC_DELAY_SECONDS, self._start_resync
+            )
+
+    def _start_resync(self):
+        self._resync_task = asyncio.create_task(self._resync())
+        self._resync_task.add_done_callback(self._on_resync_done)
+
+    def _on_resync_done(self, task: asyncio.Task):
+        if self._resync_task is task:
+            self._resync_task = None
+        if not task.cancelled() and task.exception() is not None:
+            logging.error("Failed to resync the sway tree", exc_info=task.exception())
+
+    async def _resync(self):
+        self._resync_handle = None
+        self.load(await get_tree())
+
+    def _notify(self, workspace_ids: Iterable[int]):
+        for workspace_id in workspace_ids:
+            for callback in list(self.listeners):
+                callback(workspace_id)
+
+
+_sway_tree: Optional[SwayTree] = None
+
+
+def get_tree_mirror() -> SwayTree:
+    global _sway_tree
+    if _sway_tree is None:
+        _sway_tree = SwayTree()
+    return _sway_tree
+
+
+_command_connection: Optional[SwayIpcConnection] = None
+_command_connection_lock = asyncio.Lock()
+
+
+def get_socket_path() -> Optional[str]:
+    return os.environ.get("SWAYSOCK") or os.environ.get("I3SOCK")
+
+
+async def _get_command_connection(socket_path: str) -> SwayIpcConnection:
+    global _command_connection
+    if _command_connection is not None and _command_connection.is_connected():
+        return _command_connection
+    async with _command_connection_lock:
+        if _command_connection is None or not _command_connection.is_connected():
+            connection = SwayIpcConnection(socket_path)
+            await connection.connect()
+            _command_connection = connection
+    return _command_connection
+
+
+async def ipc_request(message_type: int, payload: str = "") -> Any:
+    socket_path = get_socket_path()
+    if socket_path is None:
+        raise SwayIpcError("Neither SWAYSOCK nor I3SOCK is set")
+    connection = await _get_command_connection(socket_path)
+    return await connection.request(message_type, payload)
 
 
 async def run(cmd):
@@ -25,43 +672,52 @@ async def run_stream(cmd):
 
     assert proc.stdout is not None
 
-    buf = bytes()
-    open_obj = 0
-    open_lst = 0
+    framer = JsonStreamFramer()
     while True:
-        # TODO: Make or find a more efficient buffer for this purpose
-        c = await proc.stdout.read(n=1)
-        if not c:
+        chunk = await proc.stdout.read(STREAM_CHUNK_SIZE)
+        if not chunk:
             break
-        match c:
-            case b"{":
-                open_obj += 1
-            case b"}":
-                open_obj -= 1
-            case b"[":
-                open_lst += 1
-            case b"]":
-                open_lst -= 1
-        buf += c
-        if open_obj == 0 and open_lst == 0 and not c.isspace():
-            yield json.loads(buf)
-            buf = bytes()
+        for document in framer.feed(chunk):
+            yield document
 
 
 async def get_workspaces():
-    return await run(["swaymsg", "-t", "get_workspaces"])
+    if get_socket_path() is None:
+        return await run(["swaymsg", "-t", "get_workspaces"])
+    return await ipc_request(MessageType.GET_WORKSPACES)
 
 
 async def get_outputs():
-    return await run(["swaymsg", "-t", "get_outputs"])
+    if get_socket_path() is None:
+        return await run(["swaymsg", "-t", "get_outputs"])
+    return await ipc_request(MessageType.GET_OUTPUTS)
+
+
+async def get_tree():
+    if get_socket_path() is None:
+        return await run(["swaymsg", "-t", "get_tree"])
+    return await ipc_request(MessageType.GET_TREE)
 
 
 async def sway_command(cmd: str):
-    return await run(["swaymsg", cmd])
+    if get_socket_path() is None:
+        return await run(["swaymsg", cmd])
+    results = await ipc_request(MessageType.RUN_COMMAND, cmd)
+    for result in results:
+        if not result.get("success", False):
+            raise Exception(f"sway exception: {result.get('error', '')}")
+    return results
 
 
 async def subscribe(event_types):
-    async for event in run_stream(
-        ["swaymsg", "--monitor", "-t", "subscribe", json.dumps(event_types)]
-    ):
-        yield event
+    queue: asyncio.Queue = asyncio.Queue()
+    hub = get_event_hub()
+    subscriptions = [
+        await hub.subscribe(event_type, queue.put_nowait) for event_type in event_types
+    ]
+    try:
+        while True:
+            yield await queue.get()
+    finally:
+        for subscription in subscriptions:
+            subscription.unsubscribe()
@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import subprocess
+import sys
+from typing import Optional
+from dbus_next.errors import DBusError
+
+from ustatus.utils.bus import get_bus_manager, get_session_bus
+from ustatus.utils.introspection import get_proxy_object
+
+SYSTEM_API_NAME = "pysysapi.api"
+SYSTEM_API_PATH = "/pysysapi"
+SYSTEM_API_START_TIMEOUT_SECONDS = 10
+
+_start_task: Optional[asyncio.Task] = None
+
+
+async def ensure_system_api():
+    """Make sure the python_dbus_system_api server owns its bus name, starting
+    it if needed.
+
+    Only modules that use the API call this, so bars without them never start
+    it. The server is started through D-Bus activation when it is installed
+    as an activatable service, and otherwise spawned as a fresh interpreter
+    rather than forked from this GTK process.
+    """
+    global _start_task
+    if _start_task is None or (
+        _start_task.done()
+        and (_start_task.cancelled() or _start_task.exception() is not None)
+    ):
+        _start_task = asyncio.create_task(_start())
+    await asyncio.shield(_start_task)
+
+
+async def _start():
+    bus = await get_session_bus()
+    proxy_object = await get_proxy_object(
+        bus, "org.freedesktop.DBus", "/org/freedesktop/DBus", ["org.freedesktop.DBus"]
+    )
+    dbus_interface = proxy_object.get_interface("org.freedesktop.DBus")
+
+    appeared = asyncio.get_running_loop().create_future()
+
+    def on_name_owner_changed(msg):
+        name, _, new_owner = msg.body
+        if name == SYSTEM_API_NAME and new_owner and not appeared.done():
+            appeared.set_result(None)
+
+    handler = await get_bus_manager().add_signal_handler(
+        "org.freedesktop.DBus",
+        "NameOwnerChanged",
+        on_name_owner_changed,
+        sender="org.freedesktop.DBus",
+    )
+    try:
+        if await dbus_interface.call_name_has_owner(SYSTEM_API_NAME):
+            return
+        if SYSTEM_API_NAME in await dbus_interface.call_list_activatable_names():
+            logging.info(f"Activating {SYSTEM_API_NAME}")
+            try:
+                await dbus_interface.call_start_service_by_name(SYSTEM_API_NAME, 0)
+                return
+            except DBusError as e:
+                logging.warning(f"Failed to activate {SYSTEM_API_NAME}: {e}")
+        logging.info(f"Starting {SYSTEM_API_NAME} server")
+        subprocess.Popen(
+            [
+                sys.executable,
+                "-c",
+                "from python_dbus_system_api import start_server; start_server()",
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        await asyncio.wait_for(appeared, SYSTEM_API_START_TIMEOUT_SECONDS)
+    finally:
+        handler.remove()
@@ -0,0 +1,15 @@
+import os
+
+from ustatus.utils.cache_dir import prune_cache_dir
+
+
+def test_prune_keeps_most_recent(tmp_path):
+    for i in range(5):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(b"")
+        os.utime(path, (i, i))
+    (tmp_path / "other.pickle").write_bytes(b"")
+
+    prune_cache_dir(str(tmp_path), ".png", 2)
+
+    assert sorted(os.listdir(tmp_path)) == ["3.png", "4.png", "other.pickle"]
@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+
+pytest.importorskip("tomli")
+pytest.importorskip("jsonschema")
+
+from ustatus.config import Config, ConfigError
+
+VALID_CONFIG = """
+[bars.mybar]
+anchors = ["top"]
+orientation = "horizontal"
+modules_start = ["myclock"]
+
+[modules.myclock]
+type = "clock"
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("XDG_CONFIG_HOME", str(tmp_path / "config"))
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.setattr(sys, "argv", ["ustatus", "mybar"])
+    path = tmp_path / "config" / "ustatus" / "ustatus.toml"
+    path.parent.mkdir(parents=True)
+    path.write_text(VALID_CONFIG)
+    return path
+
+
+def test_reload_rejects_wrong_structure(config_file):
+    config = Config()
+    bar_config = config.get_bar_config("mybar")
+
+    config_file.write_text("bars = 3\n")
+    with pytest.raises(ConfigError):
+        config.reload()
+
+    assert config.get_bar_config("mybar") == bar_config
+    assert config.get_module_config("myclock").type == "clock"
+
+
+def test_reload_rejects_wrong_table_type(config_file):
+    config = Config()
+
+    config_file.write_text('[bars]\nmybar = "oops"\n')
+    with pytest.raises(ConfigError):
+        config.reload()
+    assert config.get_bar_config("mybar").orientation == "horizontal"